@@ -46,9 +46,29 @@ class Settings:
     # Image Generation
     DEFAULT_IMAGE_SIZE: str = "512x512"
     MAX_IMAGE_GENERATION_RETRIES: int = 3
+    IMAGE_CACHE_TTL: int = int(os.getenv("IMAGE_CACHE_TTL", "86400"))  # in seconds
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # In-process cache only; ignored with Redis
+    MAX_CONCURRENT_IMAGE_REQUESTS: int = int(os.getenv("MAX_CONCURRENT_IMAGE_REQUESTS", "10"))  # Outbound Gemini/Stability calls
+    IMAGE_ENHANCE_TIMEOUT: float = float(os.getenv("IMAGE_ENHANCE_TIMEOUT", "10"))  # Seconds Gemini prompt enhancement may take before the base prompt is used
+    MAX_TRACKED_IMAGE_JOBS: int = 1000  # Finished background image jobs kept for status polling
+    PROCEDURAL_IMAGE_FORMAT: str = os.getenv("PROCEDURAL_IMAGE_FORMAT", "png").lower()  # "png" or "webp"
+    
+    # Caching - set REDIS_URL to share cached responses across workers
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    CACHE_VERSION: str = os.getenv("CACHE_VERSION", "v1")  # Bump to invalidate all cached entries
+    
+    # Sentiment Analysis
+    SENTIMENT_ANALYZER: str = os.getenv("SENTIMENT_ANALYZER", "textblob").lower()  # "textblob" or "vader"
+    # Entries shorter than this many words are scored with VADER even under TextBlob (0 disables)
+    SENTIMENT_SHORT_TEXT_WORDS: int = int(os.getenv("SENTIMENT_SHORT_TEXT_WORDS", "0"))
     
     # Story Generation
     MAX_STORY_LENGTH: int = 1000
+    STORY_CACHE_TTL: int = int(os.getenv("STORY_CACHE_TTL", "0"))  # in seconds; 0 disables, since stories are sampled to vary
+    STORY_HEDGE_DELAY: float = float(os.getenv("STORY_HEDGE_DELAY", "5"))  # Seconds Gemini runs alone before Groq is also tried
+    MAX_CONCURRENT_STORY_REQUESTS: int = int(os.getenv("MAX_CONCURRENT_STORY_REQUESTS", "5"))  # Outbound Gemini/Groq calls
+    STORY_BREAKER_FAILURES: int = int(os.getenv("STORY_BREAKER_FAILURES", "5"))  # Consecutive provider failures before it is skipped
+    STORY_BREAKER_OPEN_SECONDS: float = float(os.getenv("STORY_BREAKER_OPEN_SECONDS", "60"))
     STORY_STYLES: list = [
         "allegory",
         "fairy_tale", 
@@ -9,6 +9,7 @@ import os
 from app.config import settings
 from app.database import init_db
 from app.routers import sanctuary_router, story_router, skills_router
+from app.services import image_generation_service
 
 # Configure logging for Render
 logging.basicConfig(
@@ -113,6 +114,7 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown."""
     logger.info("🛑 HavenMind API shutting down...")
+    await image_generation_service.aclose()
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON, Index
 from sqlalchemy.sql import func
 from app.database import Base
 from pydantic import BaseModel, Field
@@ -62,6 +62,16 @@ class UserSkill(Base):
     last_practiced = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        # Skills are looked up by session and name when practicing and unlocking
+        Index("ix_user_skills_session_skill", "session_id", "skill_name"),
+        # Unlocked skills per session; partial, so locked rows aren't indexed
+        Index(
+            "ix_user_skills_session_unlocked", "session_id",
+            sqlite_where=unlocked.is_(True), postgresql_where=unlocked.is_(True)
+        ),
+    )
 
 class SkillSession(Base):
     __tablename__ = "skill_sessions"
@@ -75,6 +85,11 @@ class SkillSession(Base):
     emotions_before = Column(JSON, nullable=True)
     emotions_after = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Practice streaks scan a session's sessions by date
+        Index("ix_skill_sessions_session_created", "session_id", "created_at"),
+    )
 
 # Pydantic Models for API
 class SanctuaryElementCreate(BaseModel):
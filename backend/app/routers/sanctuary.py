@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+from pydantic import BaseModel
 import logging
 
 
@@ -26,6 +27,13 @@ from app.utils.helpers import (
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/sanctuary", tags=["sanctuary"])
 
+# Request model for sanctuary element image generation
+class SanctuaryImageRequest(BaseModel):
+    element_type: str
+    emotion: str
+    journal_entry: str
+    style: str = "fantasy-art"
+
 @router.post("/journal-entry")
 async def create_journal_entry(
     entry_data: JournalEntryCreate,
@@ -38,7 +46,7 @@ async def create_journal_entry(
         session_id = entry_data.session_id or generate_session_id()
         
         # Analyze sentiment and emotion
-        analysis = sentiment_service.analyze_sentiment(entry_data.content)
+        analysis = await sentiment_service.analyze_sentiment_async(entry_data.content)
         
         primary_emotion = analysis["primary_emotion"]
         sentiment_score = analysis["sentiment_score"]
@@ -350,6 +358,27 @@ async def delete_sanctuary_element(element_id: int, db: Session = Depends(get_db
         logger.error(f"Error deleting sanctuary element: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete element")
 
+@router.post("/generate-image/jobs")
+async def enqueue_sanctuary_image(image_request: SanctuaryImageRequest):
+    """Start sanctuary element image generation in the background and return a job id to poll."""
+    job_id = image_generation_service.enqueue_sanctuary_image(
+        element_type=image_request.element_type,
+        emotion=image_request.emotion,
+        journal_entry=image_request.journal_entry,
+        style=image_request.style
+    )
+    
+    return {"job_id": job_id, "status": "pending"}
+
+@router.get("/generate-image/jobs/{job_id}")
+async def get_sanctuary_image_job(job_id: str):
+    """Get the status and, once completed, the image URL of a sanctuary image job."""
+    job = image_generation_service.get_image_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Image job not found")
+    
+    return job
+
 @router.get("/session/new")
 async def create_new_session():
     """Create a new session ID."""
@@ -171,7 +171,7 @@ async def get_skill_recommendations(session_id: str, db: Session = Depends(get_d
         # Get user's current skills
         user_skills = db.query(UserSkill).filter(
             UserSkill.session_id == session_id,
-            UserSkill.unlocked == True
+            UserSkill.unlocked.is_(True)
         ).all()
         
         unlocked_skills = {skill.skill_name for skill in user_skills}
@@ -377,7 +377,7 @@ async def get_skill_recommendations(session_id: str, db: Session = Depends(get_d
         # Get user's current skills
         user_skills = db.query(UserSkill).filter(
             UserSkill.session_id == session_id,
-            UserSkill.unlocked == True
+            UserSkill.unlocked.is_(True)
         ).all()
         
         unlocked_skills = {skill.skill_name for skill in user_skills}
@@ -96,6 +96,27 @@ async def generate_story_image(
         logger.error(f"Error generating story image: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate story image")
 
+@router.post("/generate-image/jobs")
+async def enqueue_story_image(image_request: StoryImageRequest):
+    """Start story image generation in the background and return a job id to poll."""
+    job_id = image_generation_service.enqueue_story_image(
+        story_content=image_request.story_content,
+        story_title=image_request.story_title,
+        style=image_request.style,
+        theme=image_request.theme
+    )
+    
+    return {"job_id": job_id, "status": "pending"}
+
+@router.get("/generate-image/jobs/{job_id}")
+async def get_story_image_job(job_id: str):
+    """Get the status and, once completed, the image URL of a story image job."""
+    job = image_generation_service.get_image_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Image job not found")
+    
+    return job
+
 @router.get("/history/{session_id}", response_model=List[StoryResponse])
 async def get_story_history(
     session_id: str,
@@ -2,21 +2,977 @@ import httpx
 import asyncio
 import logging
 import base64
+import re
 import io
+import numpy as np
 from PIL import Image, ImageDraw, ImageFilter
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, FrozenSet, Mapping, Tuple
 from app.config import settings
+from app.utils.cache import ResponseCache, normalize_cache_text
+from app.utils.keyword_index import KeywordIndex
 import random
 import math
+import uuid
+import importlib.util
+from functools import lru_cache
+from itertools import islice
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from urllib.parse import quote, urlencode
 
 logger = logging.getLogger(__name__)
 
+# Procedural image color palettes (read-only, shared across calls)
+_STORY_PALETTES = {
+    "adventure": MappingProxyType({
+        "primary": (34, 139, 34),     # Forest green
+        "secondary": (255, 215, 0),   # Gold
+        "accent": (70, 130, 180),     # Steel blue
+        "background": (135, 206, 235)  # Sky blue
+    }),
+    "mystery": MappingProxyType({
+        "primary": (75, 0, 130),      # Indigo
+        "secondary": (128, 0, 128),   # Purple
+        "accent": (169, 169, 169),    # Dark gray
+        "background": (25, 25, 112)   # Midnight blue
+    }),
+    "fantasy": MappingProxyType({
+        "primary": (148, 0, 211),     # Dark violet
+        "secondary": (255, 20, 147),  # Deep pink
+        "accent": (0, 255, 255),      # Cyan
+        "background": (72, 61, 139)   # Dark slate blue
+    }),
+    "romance": MappingProxyType({
+        "primary": (255, 182, 193),   # Light pink
+        "secondary": (255, 105, 180), # Hot pink
+        "accent": (255, 228, 225),    # Misty rose
+        "background": (255, 240, 245)  # Lavender blush
+    })
+}
+
+_DEFAULT_STORY_PALETTE = MappingProxyType({
+    "primary": (34, 139, 34),     # Default green
+    "secondary": (255, 215, 0),   # Gold
+    "accent": (135, 206, 235),    # Sky blue
+    "background": (240, 248, 255) # Alice blue
+})
+
+_EMOTION_PALETTES = {
+    "joy": MappingProxyType({
+        "primary": (255, 215, 0),    # Gold
+        "secondary": (255, 165, 0),  # Orange
+        "accent": (255, 255, 224)    # Light yellow
+    }),
+    "love": MappingProxyType({
+        "primary": (255, 182, 193),  # Light pink
+        "secondary": (255, 105, 180), # Hot pink
+        "accent": (255, 228, 225)    # Misty rose
+    }),
+    "calm": MappingProxyType({
+        "primary": (173, 216, 230),  # Light blue
+        "secondary": (176, 196, 222), # Light steel blue
+        "accent": (240, 248, 255)    # Alice blue
+    }),
+    "sadness": MappingProxyType({
+        "primary": (70, 130, 180),   # Steel blue
+        "secondary": (100, 149, 237), # Cornflower blue
+        "accent": (176, 196, 222)    # Light steel blue
+    }),
+    "anxiety": MappingProxyType({
+        "primary": (128, 128, 128),  # Gray
+        "secondary": (105, 105, 105), # Dim gray
+        "accent": (211, 211, 211)    # Light gray
+    })
+}
+
+_DEFAULT_EMOTION_PALETTE = MappingProxyType({
+    "primary": (144, 238, 144),   # Light green
+    "secondary": (152, 251, 152), # Pale green
+    "accent": (240, 255, 240)     # Honeydew
+})
+
+# Curated image source for the high-quality fallback
+_UNSPLASH_BASE = "https://source.unsplash.com/1344x768/"
+# Collections known for high-quality landscape/fantasy images
+_UNSPLASH_COLLECTIONS_QUERY = urlencode({"collections": "1114848,1127901,3356108"}, safe=",")
+
+# Curated image search keywords for the high-quality fallback
+_FALLBACK_THEME_KEYWORDS = {
+    "adventure": {
+        "primary": "mountain landscape adventure",
+        "secondary": "epic cinematic"
+    },
+    "mystery": {
+        "primary": "dark forest mysterious",
+        "secondary": "dramatic atmospheric"
+    },
+    "fantasy": {
+        "primary": "magical forest fantasy",
+        "secondary": "ethereal cinematic"
+    },
+    "romance": {
+        "primary": "beautiful garden romantic",
+        "secondary": "soft lighting"
+    },
+    "wisdom": {
+        "primary": "ancient library wisdom",
+        "secondary": "golden hour"
+    }
+}
+
+_FALLBACK_LOCATIONS = {
+    "forest": "dense forest trees",
+    "castle": "medieval castle architecture", 
+    "room": "elegant interior room",
+    "classroom": "ancient library classroom",
+    "school": "mystical academy interior",
+    "hall": "grand hall architecture",
+    "chamber": "ancient chamber interior",
+    "library": "ancient library books",
+    "temple": "sacred temple interior",
+    "mountain": "mountain landscape vista",
+    "ocean": "ocean waves seascape",
+    "cave": "mysterious cave entrance",
+    "garden": "beautiful garden flowers",
+    "village": "medieval village town",
+    "desert": "desert dunes landscape",
+    "river": "flowing river nature"
+}
+
+_FALLBACK_CHARACTERS = {
+    "traveler": "lone figure journey",
+    "hero": "heroic silhouette",
+    "teacher": "wise sage scholar",
+    "sage": "wise elder",
+    "warrior": "brave fighter",
+    "student": "young learner seeker",
+    "sam": "person figure silhouette"
+}
+
+# Sanctuary element prompt templates
+_ELEMENT_DESCRIPTIONS = {
+    "flower": "a beautiful, ethereal flower with delicate petals",
+    "tree": "a majestic, ancient tree with flowing branches", 
+    "crystal": "a luminous, mystical crystal formation",
+    "butterfly": "a graceful butterfly with iridescent wings",
+    "bird": "a serene bird perched peacefully",
+    "plant": "a lush, verdant plant with vibrant leaves",
+    "stone": "a smooth, weathered stone with natural patterns",
+    "water": "flowing, crystalline water with gentle ripples",
+    "cloud": "a soft, dreamy cloud formation",
+    "rock": "a solid, grounding rock formation",
+    "moss": "soft, green moss covering ancient surfaces",
+    "mist": "ethereal mist swirling gently",
+    "stream": "a peaceful stream with clear water",
+    "cave": "a mystical cave entrance with soft lighting",
+    "shadow": "gentle shadows creating depth and mystery",
+    "wind": "visible air currents creating movement"
+}
+
+_EMOTION_MODIFIERS = {
+    "joy": "radiating golden light, warm and uplifting",
+    "love": "glowing with pink and rose tones, heart-warming",
+    "gratitude": "surrounded by warm, amber light",
+    "hope": "shimmering with silver and blue light",
+    "calm": "emanating peaceful, soft blue energy",
+    "sadness": "touched with gentle blue and purple hues",
+    "anger": "flickering with controlled red energy",
+    "fear": "shrouded in protective, dark tones",
+    "anxiety": "surrounded by swirling, muted colors",
+    "neutral": "balanced with natural, earth tones"
+}
+
+_STYLE_SUFFIXES = {
+    "fantasy-art": ", fantasy art style, magical realism, soft lighting, 4k quality",
+    "nature": ", natural photography style, organic, soft focus",
+    "abstract": ", abstract art style, flowing forms, artistic interpretation",
+    "watercolor": ", watercolor painting style, soft edges, artistic",
+    "digital-art": ", digital art style, clean lines, modern aesthetic"
+}
+
+# Journal themes that shape sanctuary element prompts
+_VISUAL_THEMES = {
+    "growth": ["growing", "blooming", "flourishing"],
+    "strength": ["strong", "powerful", "resilient"],
+    "peace": ["peaceful", "calm", "serene"],
+    "transformation": ["changing", "becoming", "evolving"],
+    "connection": ["together", "connected", "unity"],
+    "healing": ["healing", "recovery", "restoration"],
+    "freedom": ["free", "liberated", "soaring"],
+    "protection": ["safe", "protected", "sheltered"]
+}
+
+# Story scene prompt templates
+_THEME_SETTINGS = {
+    "wisdom": "an ancient library or study",
+    "adventure": "a mystical landscape",
+    "mystery": "a shadowy, atmospheric place",
+    "fantasy": "a magical realm",
+    "meditation": "a peaceful, serene environment"
+}
+
+_STORY_EMOTION_MODIFIERS = {
+    "wise": "with ancient wisdom and golden light",
+    "peaceful": "with serene, calming atmosphere",
+    "mysterious": "with dramatic shadows and intrigue",
+    "magical": "with ethereal, mystical energy",
+    "powerful": "with strength and determination",
+    "gentle": "with soft, warm lighting",
+    "ancient": "with timeless, sacred atmosphere"
+}
+
+_STYLE_ENHANCEMENTS = {
+    "fantasy-art": "fantasy art style, magical realism, cinematic lighting",
+    "realistic": "photorealistic, natural lighting, detailed",
+    "artistic": "artistic illustration, painterly style",
+    "watercolor": "watercolor painting, soft edges, artistic",
+    "digital-art": "digital art, clean composition, modern",
+    "cinematic": "cinematic composition, dramatic lighting, film-like"
+}
+
+_THEME_ATMOSPHERES = {
+    "adventure": "epic adventure atmosphere, heroic composition",
+    "mystery": "mysterious atmosphere, dramatic shadows",
+    "romance": "romantic lighting, soft warm tones",
+    "fantasy": "magical fantasy world, ethereal elements",
+    "wisdom": "scholarly atmosphere, golden hour lighting",
+    "meditation": "peaceful, contemplative mood",
+    "transformation_and_growth": "uplifting, transformative lighting",
+    "connection_and_belonging": "warm, welcoming atmosphere"
+}
+
+# Story content extraction tables
+_LOCATION_KEYWORDS = {
+    "classroom": ["classroom", "class", "school room"],
+    "library": ["library", "archive", "book hall"],
+    "forest": ["forest", "woods", "woodland", "trees", "grove"],
+    "castle": ["castle", "fortress", "palace", "tower", "citadel"],
+    "village": ["village", "town", "marketplace", "square", "hamlet"],
+    "mountain": ["mountain", "peak", "cliff", "valley", "hill"],
+    "ocean": ["ocean", "sea", "beach", "shore", "waves", "coast"],
+    "cave": ["cave", "cavern", "underground", "tunnel", "grotto"],
+    "room": ["room", "chamber", "hall", "study", "parlor"],
+    "garden": ["garden", "meadow", "field", "flowers", "courtyard"],
+    "city": ["city", "street", "urban", "buildings", "plaza"],
+    "desert": ["desert", "sand", "dunes", "oasis", "wasteland"],
+    "temple": ["temple", "shrine", "sanctuary", "sacred place"],
+    "bridge": ["bridge", "crossing", "walkway"],
+    "path": ["path", "road", "trail", "pathway", "route"],
+    "door": ["doorway", "entrance", "threshold", "gate"],
+    "window": ["window", "opening", "view"],
+    "stairs": ["stairs", "staircase", "steps"],
+    "attic": ["attic", "loft", "upper room"],
+    "basement": ["basement", "cellar", "lower level"],
+    "kitchen": ["kitchen", "dining room"],
+    "bedroom": ["bedroom", "sleeping chamber"],
+    "office": ["office", "workspace", "study"]
+}
+
+_LOCATION_DESCRIPTIONS = {
+    "classroom": "ancient classroom with wooden desks and mystical atmosphere",
+    "library": "grand library with towering bookshelves",
+    "forest": "mystical forest with ancient trees",
+    "castle": "medieval castle with stone walls",
+    "village": "quaint medieval village",
+    "mountain": "majestic mountain landscape",
+    "ocean": "vast ocean with rolling waves",
+    "cave": "mysterious cave with natural formations",
+    "room": "elegant interior room",
+    "garden": "beautiful garden with flowers",
+    "city": "bustling medieval city",
+    "desert": "vast desert landscape",
+    "temple": "sacred temple with ancient architecture",
+    "bridge": "old stone bridge",
+    "path": "winding path through nature",
+    "door": "ornate doorway",
+    "window": "arched window with view",
+    "stairs": "grand staircase",
+    "attic": "cozy attic space",
+    "basement": "stone basement chamber",
+    "kitchen": "rustic kitchen",
+    "bedroom": "comfortable bedroom",
+    "office": "scholarly study room"
+}
+
+_ATMOSPHERE_INDICATORS = {
+    "ancient": "ancient",
+    "old": "old",
+    "dark": "shadowy",
+    "bright": "brightly lit",
+    "mysterious": "mysterious",
+    "peaceful": "peaceful",
+    "sacred": "sacred",
+    "hidden": "hidden",
+    "secret": "secret",
+    "magical": "magical",
+    "enchanted": "enchanted"
+}
+
+# Capitalized words that may be character names
+_PROPER_NOUN_RE = re.compile(r'\b[A-Z][a-z]+\b')
+_WORD_RE = re.compile(r'\w+')
+
+# Typographic quotes (common in LLM output) mapped to ASCII so possessives like "Mira’s" match
+_STORY_NORMALIZE_TABLE = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'})
+
+# Words followed or preceded by a name indicator ("Mira enters", "named Mira", "Mira's")
+_NAME_BEFORE_INDICATOR_RE = re.compile(
+    r"\b(?=([a-z]+)(?: (?:enters|walks|sits|stands|goes|comes|looks|speaks|says)|'s\b| (?:was|is|had|has)\b))",
+    re.IGNORECASE
+)
+_NAME_AFTER_INDICATOR_RE = re.compile(r'\b(?=(?:said|called|named) ([a-z]+)\b)', re.IGNORECASE)
+
+# Capitalized words that are never treated as character names
+_COMMON_NAME_WORDS = frozenset({
+    'The', 'And', 'But', 'For', 'Or', 'A', 'An', 'This', 'That', 'With', 'Through',
+    'Every', 'Story', 'They', 'Said', 'Your', 'Tale', 'Sam', 'Max', 'Alex', 'Jordan',
+    'Ancient', 'Scroll', 'Wisdom', 'Ages', 'Truth', 'Classroom', 'Teacher', 'Contribution'
+})
+
+# Pronouns hinting at unnamed characters
+_HE_PRONOUNS = frozenset({'he', 'him', 'his'})
+_SHE_PRONOUNS = frozenset({'she', 'her', 'hers'})
+_THEY_PRONOUNS = frozenset({'they', 'them', 'their'})
+
+_ACTION_PATTERNS = {
+    name: re.compile(pattern, re.IGNORECASE)
+    for name, pattern in {
+        "entering": r'\b(enter|enters|entering|walked into|steps into|goes into)\b',
+        "walking": r'\b(walk|walks|walking|stroll|strolls|pace|paces)\b',
+        "sitting": r'\b(sit|sits|sitting|seated|settles)\b',
+        "standing": r'\b(stand|stands|standing|stood|rise|rises)\b',
+        "looking": r'\b(look|looks|looking|gaze|gazes|stare|stares)\b',
+        "speaking": r'\b(speak|speaks|speaking|talk|talks|say|says|said)\b',
+        "smiling": r'\b(smile|smiles|smiling|grin|grins)\b',
+        "gesturing": r'\b(gesture|gestures|gesturing|point|points|wave|waves)\b',
+        "reading": r'\b(read|reads|reading|study|studies|examine|examines)\b',
+        "writing": r'\b(write|writes|writing|scribe|scribes)\b',
+        "discovering": r'\b(discover|discovers|find|finds|uncover|uncovers)\b',
+        "exploring": r'\b(explore|explores|exploring|search|searches|investigate)\b',
+        "meeting": r'\b(meet|meets|meeting|encounter|encounters|greet|greets)\b',
+        "learning": r'\b(learn|learns|learning|understand|understands|realize|realizes)\b',
+        "teaching": r'\b(teach|teaches|teaching|instruct|instructs|guide|guides)\b',
+        "traveling": r'\b(travel|travels|traveling|journey|journeys|move|moves)\b',
+        "opening": r'\b(open|opens|opening|unlock|unlocks)\b',
+        "closing": r'\b(close|closes|closing|shut|shuts)\b',
+        "creating": r'\b(create|creates|creating|make|makes|build|builds)\b',
+        "transforming": r'\b(transform|transforms|change|changes|become|becomes)\b'
+}.items()
+}
+
+_STORY_EMOTION_KEYWORDS = {
+    "wise": ["wise", "wisdom", "sage", "ancient", "knowing"],
+    "peaceful": ["peaceful", "calm", "serene", "tranquil", "still"],
+    "mysterious": ["mysterious", "mystery", "enigmatic", "cryptic"],
+    "magical": ["magical", "mystical", "enchanted", "ethereal"],
+    "powerful": ["powerful", "strong", "mighty", "commanding"],
+    "gentle": ["gentle", "soft", "tender", "kind"],
+    "ancient": ["ancient", "old", "timeless", "eternal"],
+    "sacred": ["sacred", "holy", "blessed", "divine"],
+    "warm": ["warm", "cozy", "welcoming", "comfortable"],
+    "dramatic": ["dramatic", "intense", "striking", "bold"]
+}
+
+_ACTION_PRIORITY = (
+    "entering", "discovering", "transforming", "teaching", "learning", 
+    "meeting", "creating", "gesturing", "smiling", "speaking",
+    "reading", "writing", "exploring", "traveling", "opening",
+    "walking", "standing", "sitting", "looking", "closing"
+)
+
+# Objects worth calling out in a story scene prompt
+_PROMPT_OBJECTS = frozenset({
+    "scroll", "book", "desk", "door", "window", "chair", "table",
+    "candle", "lamp", "mirror", "painting", "sword", "staff"
+})
+
+_SIGNIFICANT_OBJECTS = {
+    "scroll": ["scroll", "parchment", "manuscript"],
+    "book": ["book", "tome", "volume", "text"],
+    "desk": ["desk", "table", "surface"],
+    "chair": ["chair", "seat", "throne"],
+    "door": ["door", "doorway", "entrance", "portal"],
+    "window": ["window", "opening"],
+    "candle": ["candle", "flame", "light"],
+    "lamp": ["lamp", "lantern", "torch"],
+    "mirror": ["mirror", "reflection", "glass"],
+    "painting": ["painting", "portrait", "artwork"],
+    "staff": ["staff", "wand", "rod"],
+    "crystal": ["crystal", "gem", "jewel"],
+    "tree": ["tree", "oak", "pine", "willow"],
+    "flower": ["flower", "rose", "bloom", "blossom"],
+    "stone": ["stone", "rock", "boulder"],
+    "water": ["water", "stream", "river", "pond"]
+}
+
+# Keyword indexes over the tables above, built once at import
+_LOCATION_INDEX = KeywordIndex(_LOCATION_KEYWORDS)
+_ATMOSPHERE_INDEX = KeywordIndex({indicator: [indicator] for indicator in _ATMOSPHERE_INDICATORS})
+_STORY_EMOTION_INDEX = KeywordIndex(_STORY_EMOTION_KEYWORDS)
+_OBJECT_INDEX = KeywordIndex(_SIGNIFICANT_OBJECTS)
+_VISUAL_THEME_INDEX = KeywordIndex(_VISUAL_THEMES)
+
+# Texts shorter than this carry too little detail to be worth a paid image API call
+_MIN_IMAGE_TEXT_LENGTH = 20
+
+# Gemini prompt-enhancement request, filled in per call with format_map
+_GEMINI_ENHANCE_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+_GEMINI_PROMPT_TEMPLATE = """You are an expert at creating detailed, cinematic image generation prompts. 
+
+Analyze this story content and create a vivid visual scene:
+Story Content: "{story_content}"
+Basic Prompt: "{base_prompt}"
+
+Instructions:
+1. Read the story content carefully and identify the key visual elements:
+   - Who are the characters? (names, descriptions, roles)
+   - Where does this scene take place? (specific location, atmosphere)
+   - What is happening? (actions, interactions, emotions)
+   - What objects or details are important?
+
+2. Create a detailed image prompt that includes:
+   - Character descriptions (age, appearance, clothing, pose)
+   - Specific setting details (architecture, furniture, lighting, atmosphere)
+   - Mood and lighting (golden hour, candlelight, natural light, shadows)
+   - Artistic style (cinematic, realistic, fantasy art, dramatic)
+   - Color palette (warm/cool tones, specific colors mentioned)
+   - Composition (foreground/background, perspective, depth of field)
+
+3. Make it cinematic and atmospheric while staying true to the story content.
+4. Focus on creating a scene that feels alive and immersive.
+5. If characters are mentioned by name, include them naturally in the scene.
+
+Example of good prompt style:
+"A wise elderly teacher with gentle eyes and flowing robes, sitting behind an ornate wooden desk in an ancient library, gesturing toward an illuminated scroll, warm golden candlelight casting soft shadows, cinematic composition, fantasy art style, detailed and atmospheric"
+
+Return only the enhanced visual prompt, nothing else."""
+
+# Stability AI text-to-image request parts that never change between calls
+_STABILITY_TEXT_TO_IMAGE_URL = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
+_STABILITY_PROMPT_SUFFIX = ", photorealistic, highly detailed, professional photography, cinematic lighting, 8k resolution, masterpiece"
+# Enhanced negative prompt for better quality
+_STABILITY_NEGATIVE_PROMPT = "blurry, low quality, distorted, ugly, nsfw, violent, text, watermark, cartoon, anime, childish, simple shapes, geometric, abstract art, low resolution, pixelated, artifact"
+_STABILITY_STORY_PARAMS = MappingProxyType({
+    "width": 1344, "height": 768,  # Valid SDXL dimension for story scenes
+    "style_preset": "cinematic",
+    "cfg_scale": 8,
+    "steps": 40  # More steps for better quality
+})
+_STABILITY_SANCTUARY_PARAMS = MappingProxyType({
+    "width": 1024, "height": 1024,  # Valid SDXL dimension for sanctuary elements
+    "style_preset": "fantasy-art",
+    "cfg_scale": 7,
+    "steps": 30
+})
+
+# Single-pass box blurs with the same variance as GaussianBlur(radius=0.5) and
+# GaussianBlur(radius=0.3), which run three box passes over the image. At these
+# sub-pixel radii the results differ by a few levels at edges and run ~2x faster.
+_SOFT_BLUR = ImageFilter.BoxBlur(1 / 6)
+_FAINT_BLUR = ImageFilter.BoxBlur(0.0495)
+
+# Pixels around an element's bounding box that the 3x3 mood filters can reach
+_MOOD_FILTER_MARGIN = 2
+
+# Saturation factors for the joy and sadness mood filters (1.0 leaves colors unchanged)
+_JOY_SATURATION = 1.3
+_SADNESS_SATURATION = 0.5
+
+# Procedural elements drawn without randomness; their images only depend on (element_type, emotion)
+_STATIC_ELEMENT_TYPES = frozenset({"butterfly", "bird", "water"})
+_MAX_STATIC_ELEMENT_IMAGES = 64
+
+# HTTP/2 lets concurrent image calls share one connection; it needs the optional h2 package
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Upstream responses worth retrying; other 4xx errors (auth, credits, bad request) are final
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+async def _with_backoff(fn, *, max_retries: int = 3, base: float = 1.0, cap: float = 30.0, retry_timeouts: bool = True):
+    """Await fn(), retrying transient HTTP failures with capped exponential backoff and jitter.
+
+    Pass retry_timeouts=False for billed calls: a timed-out request may still have
+    been processed and charged, and each retry can wait out the full timeout again.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code not in _RETRYABLE_STATUS_CODES:
+                raise
+            if not retry_timeouts and isinstance(e, httpx.TimeoutException):
+                raise
+            if attempt >= max_retries:
+                raise
+            delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(0, 0.5))
+            logger.warning(f"Transient API error ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+@lru_cache(maxsize=8)
+def _ocean_wave_points(width: int, height: int) -> Tuple[Tuple[float, ...], ...]:
+    """Wave line vertices for each ocean band, computed once per canvas size."""
+    rows = np.arange(height * 2 // 5, height, 10)
+    xs = np.arange(0, width, 20)
+    wave_points = np.empty((rows.size, xs.size * 2))
+    wave_points[:, 0::2] = xs
+    wave_points[:, 1::2] = rows[:, None] + np.sin(xs * 0.02 + rows[:, None] * 0.1) * 5
+    return tuple(map(tuple, wave_points.tolist()))
+
+@lru_cache(maxsize=16)
+def _unit_polygon(sides: int) -> Tuple[Tuple[float, float], ...]:
+    """(cos, sin) of each vertex angle of a regular polygon, starting at angle 0."""
+    return tuple(
+        (math.cos((2 * math.pi * i) / sides), math.sin((2 * math.pi * i) / sides))
+        for i in range(sides)
+    )
+
+def _regular_polygon_points(center_x: float, center_y: float, sides: int, radius) -> List[float]:
+    """Flat [x0, y0, x1, y1, ...] vertex list of a regular polygon, starting at angle 0.
+    
+    radius may also be a list with one radius per vertex for irregular shapes.
+    The angle tables are cached per side count, so only the scaling happens here.
+    """
+    radii = [radius] * sides if isinstance(radius, (int, float)) else radius
+    points = []
+    for (cos_a, sin_a), vertex_radius in zip(_unit_polygon(sides), radii):
+        points.extend([center_x + cos_a * vertex_radius, center_y + sin_a * vertex_radius])
+    return points
+
+def _adjust_saturation(image: Image.Image, factor: float) -> Image.Image:
+    """Scale color saturation of an RGBA image, keeping its alpha channel.
+    
+    Blends against the luminance image in Pillow's C loops; factors above 1
+    extrapolate away from gray and are clipped to the valid range.
+    """
+    rgb = image.convert("RGB")
+    gray = rgb.convert("L").convert("RGB")
+    adjusted = Image.blend(gray, rgb, factor)
+    adjusted.putalpha(image.getchannel("A"))
+    return adjusted
+
+def _image_data_url(image: Image.Image) -> str:
+    """Encode a procedural image as a base64 data URL.
+    
+    PNG uses zlib level 1, several times faster than the default level 6 at
+    little extra size on flat-colored procedural art. Setting
+    PROCEDURAL_IMAGE_FORMAT=webp switches to a fast lossy WebP encode instead.
+    The bytes are encoded straight from the buffer's memory instead of a
+    getvalue() copy.
+    """
+    buffer = io.BytesIO()
+    if settings.PROCEDURAL_IMAGE_FORMAT == "webp":
+        image.save(buffer, format='WEBP', quality=85, method=0)
+        mime_type = "image/webp"
+    else:
+        image.save(buffer, format='PNG', compress_level=1, optimize=False)
+        mime_type = "image/png"
+    with buffer.getbuffer() as image_bytes:
+        img_str = base64.b64encode(image_bytes).decode('ascii')
+    
+    return f"data:{mime_type};base64,{img_str}"
+
+@dataclass(frozen=True)
+class StoryFeatures:
+    """Story text analyzed once and shared by all story extractors."""
+    text: str
+    text_lower: str
+    tokens: FrozenSet[str]
+    proper_nouns: FrozenSet[str]
+
+def _analyze_story(story_content: str) -> StoryFeatures:
+    """Normalize, lowercase and tokenize story content once."""
+    text = story_content.translate(_STORY_NORMALIZE_TABLE)
+    text_lower = text.lower()
+    return StoryFeatures(
+        text=text,
+        text_lower=text_lower,
+        tokens=frozenset(_WORD_RE.findall(text_lower)),
+        proper_nouns=frozenset(_PROPER_NOUN_RE.findall(text))
+    )
+
+# Story extractors and prompt builders only depend on their arguments, so they live at
+# module level and the builders are memoized without holding on to the service
+def _extract_story_characters(features: StoryFeatures) -> list:
+    """Extract character names and descriptions from any story content dynamically."""
+    characters = []
+    text_lower = features.text_lower
+    
+    # Distinct proper nouns that could be names (capitalized words), minus common non-name words
+    candidates = {name for name in features.proper_nouns if len(name) > 2} - _COMMON_NAME_WORDS
+    
+    if candidates:
+        # Words used as a name somewhere in the text (preceded/followed by common name indicators)
+        named_words = {word.lower() for word in _NAME_BEFORE_INDICATOR_RE.findall(features.text)}
+        named_words.update(word.lower() for word in _NAME_AFTER_INDICATOR_RE.findall(features.text))
+        
+        # Add actual names found in text
+        characters = [name for name in candidates if name.lower() in named_words]
+    
+    # Common character references
+    character_references = {
+        'teacher': 'wise teacher',
+        'sage': 'ancient sage', 
+        'student': 'student',
+        'traveler': 'traveler',
+        'hero': 'hero',
+        'warrior': 'warrior',
+        'guide': 'guide',
+        'master': 'master',
+        'scholar': 'scholar',
+        'seeker': 'seeker',
+        'wanderer': 'wanderer'
+    }
+    
+    for ref, description in character_references.items():
+        if ref in text_lower and description not in characters:
+            characters.append(description)
+    
+    # Generic character indicators
+    pronouns_found = []
+    if not _HE_PRONOUNS.isdisjoint(features.tokens):
+        pronouns_found.append('a man')
+    if not _SHE_PRONOUNS.isdisjoint(features.tokens):
+        pronouns_found.append('a woman')
+    if not _THEY_PRONOUNS.isdisjoint(features.tokens) and not characters:
+        pronouns_found.append('people')
+    
+    # Add pronouns only if no specific characters found
+    if not characters and pronouns_found:
+        characters.extend(pronouns_found)
+    
+    return list(set(characters))[:3]  # Limit to 3 main characters
+
+def _extract_story_settings(features: StoryFeatures) -> list:
+    """Extract setting descriptions from any story content dynamically."""
+    settings = []
+    text_lower = features.text_lower
+    
+    # Find all matching locations
+    found_locations = _LOCATION_INDEX.find(text_lower)
+    if "room" in found_locations and any(specific in text_lower for specific in ["class", "bed", "dining", "living"]):
+        found_locations.remove("room")  # Skip generic "room" if more specific room found
+    
+    # Add descriptions for found locations
+    for location in found_locations:
+        if location in _LOCATION_DESCRIPTIONS:
+            settings.append(_LOCATION_DESCRIPTIONS[location])
+    
+    # Look for atmospheric descriptors
+    found_atmosphere = [_ATMOSPHERE_INDICATORS[indicator] for indicator in _ATMOSPHERE_INDEX.find(text_lower)]
+    
+    # Combine settings with atmosphere
+    if settings and found_atmosphere:
+        settings[0] = f"{found_atmosphere[0]} {settings[0]}"
+    elif not settings and found_atmosphere:
+        settings.append(f"{found_atmosphere[0]} interior space")
+    elif not settings:
+        # Default atmospheric setting
+        settings.append("cinematic interior scene")
+    
+    return settings[:2]  # Return top 2 settings
+
+def _extract_story_actions(features: StoryFeatures) -> list:
+    """Extract key actions from any story content dynamically."""
+    found_actions = []
+    for action, pattern in _ACTION_PATTERNS.items():
+        if pattern.search(features.text_lower):
+            found_actions.append(action)
+    
+    # Sort found actions by priority (more specific actions first)
+    prioritized_actions = []
+    for priority_action in _ACTION_PRIORITY:
+        if priority_action in found_actions:
+            prioritized_actions.append(priority_action)
+    
+    # Add any remaining actions not in priority list
+    for action in found_actions:
+        if action not in prioritized_actions:
+            prioritized_actions.append(action)
+    
+    return prioritized_actions[:2]  # Return top 2 actions
+
+def _extract_story_emotions(features: StoryFeatures) -> list:
+    """Extract emotional atmosphere from story content."""
+    emotions = _STORY_EMOTION_INDEX.find(features.text_lower, limit=2)
+    
+    return emotions  # Return top 2 emotions
+
+def _extract_story_objects(features: StoryFeatures) -> list:
+    """Extract significant objects from story content."""
+    objects = _OBJECT_INDEX.find(features.text_lower, limit=3)
+    
+    return objects  # Return top 3 objects
+
+def _extract_visual_themes(journal_entry: str) -> list:
+    """Extract visual themes from journal entry for image generation."""
+    themes = _VISUAL_THEME_INDEX.find(journal_entry.lower(), limit=3)
+    
+    return themes  # Limit to 3 themes
+
+@lru_cache(maxsize=512)
+def _build_enhanced_prompt(element_type: str, emotion: str, journal_entry: str, style: str) -> str:
+    """Build the image prompt for a sanctuary element."""
+    base_desc = _ELEMENT_DESCRIPTIONS.get(element_type, "a mystical sanctuary element")
+    emotion_mod = _EMOTION_MODIFIERS.get(emotion, "with gentle, natural energy")
+    
+    # Extract key themes from journal entry
+    themes = _extract_visual_themes(journal_entry)
+    theme_desc = f", embodying themes of {', '.join(themes)}" if themes else ""
+
+    prompt = f"{base_desc} {emotion_mod}{theme_desc}{_STYLE_SUFFIXES.get(style, '')}"
+    
+    # Add quality and style modifiers
+    prompt += ", peaceful sanctuary setting, therapeutic atmosphere, high quality, detailed"
+    
+    return prompt
+
+@lru_cache(maxsize=512)
+def _build_story_prompt(story_content: str, story_title: str, style: str, theme: str) -> str:
+    """Build a story-specific image prompt from the actual story content."""
+    # Extract key elements from the actual story content dynamically
+    features = _analyze_story(story_content)
+    characters = _extract_story_characters(features)
+    settings = _extract_story_settings(features)
+    actions = _extract_story_actions(features)
+    emotions = _extract_story_emotions(features)
+    objects = _extract_story_objects(features)
+    
+    # Build dynamic prompt from actual story elements
+    prompt_parts = []
+    
+    # Add characters if found
+    if characters:
+        if len(characters) == 1:
+            prompt_parts.append(f"a person named {characters[0]}")
+        else:
+            prompt_parts.append(f"people including {', '.join(characters[:2])}")
+    
+    # Add primary action/scene
+    if actions:
+        primary_action = actions[0]
+        if "enter" in primary_action:
+            prompt_parts.append("entering")
+        elif "walk" in primary_action:
+            prompt_parts.append("walking through")
+        elif "sit" in primary_action:
+            prompt_parts.append("seated in")
+        elif "stand" in primary_action:
+            prompt_parts.append("standing in")
+        elif "discover" in primary_action:
+            prompt_parts.append("discovering")
+        elif "meet" in primary_action:
+            prompt_parts.append("meeting with")
+        else:
+            prompt_parts.append(primary_action)
+    
+    # Add setting/location
+    if settings:
+        primary_setting = settings[0]
+        prompt_parts.append(primary_setting)
+    else:
+        # Fallback based on theme if no specific setting found
+        prompt_parts.append(_THEME_SETTINGS.get(theme, "a cinematic scene"))
+    
+    # Add emotional atmosphere
+    if emotions:
+        for emotion in emotions:
+            if emotion in _STORY_EMOTION_MODIFIERS:
+                prompt_parts.append(_STORY_EMOTION_MODIFIERS[emotion])
+                break
+    
+    # Add objects if significant
+    if objects:
+        significant_objects = [obj for obj in objects if obj in _PROMPT_OBJECTS]
+        if significant_objects:
+            prompt_parts.append(f"with {significant_objects[0]} visible")
+    
+    # Construct the main prompt
+    base_prompt = " ".join(prompt_parts)
+    
+    # Add style-specific enhancements
+    style_enhancement = _STYLE_ENHANCEMENTS.get(style, "cinematic lighting, artistic")
+    
+    # Add theme-specific atmosphere
+    theme_atmosphere = _THEME_ATMOSPHERES.get(theme, "atmospheric, cinematic")
+    
+    # Final prompt assembly
+    final_prompt = f"{base_prompt}, {style_enhancement}, {theme_atmosphere}, high quality, detailed, immersive"
+    
+    # Clean up the prompt
+    final_prompt = final_prompt.replace("  ", " ").strip()
+    
+    return final_prompt
+
+@lru_cache(maxsize=256)
+def _fallback_visual_keywords(story_content: str, theme: str) -> Tuple[str, str]:
+    """Extract (primary, secondary) visual keywords optimized for realistic image search.
+    
+    Deterministic in its arguments, so results are memoized for repeated fallbacks.
+    """
+    content_lower = story_content.lower()
+    words = set(_WORD_RE.findall(content_lower))
+    
+    # Extract primary visual element
+    primary_visual = _FALLBACK_THEME_KEYWORDS.get(theme, {}).get("primary", "fantasy landscape")
+    secondary_visual = _FALLBACK_THEME_KEYWORDS.get(theme, {}).get("secondary", "cinematic")
+    
+    # Check for specific locations
+    for location, keyword in _FALLBACK_LOCATIONS.items():
+        if location in words:
+            primary_visual = keyword
+            break
+    
+    # Check for characters
+    for character, enhancement in _FALLBACK_CHARACTERS.items():
+        if character in words:
+            secondary_visual = f"{secondary_visual} {enhancement}"
+            break
+    
+    # Add atmospheric elements
+    if "dark" in words or "night" in words:
+        secondary_visual = f"{secondary_visual} night dramatic"
+    elif "bright" in words or "golden" in words:
+        secondary_visual = f"{secondary_visual} golden hour"
+    elif "misty" in words or "fog" in words:
+        secondary_visual = f"{secondary_visual} misty atmospheric"
+    
+    return primary_visual, secondary_visual
+
+def _draw_castle_base(draw, size, colors):
+    """Draw castle ground and silhouette."""
+    width, height = size
+    
+    # Draw ground
+    draw.rectangle([0, height * 0.8, width, height], fill=colors["accent"])
+    
+    # Draw castle silhouette
+    castle_width = width // 3
+    castle_height = height // 2
+    castle_x = width // 2 - castle_width // 2
+    castle_y = height - castle_height
+    
+    draw.rectangle([castle_x, castle_y, castle_x + castle_width, height], 
+                  fill=colors["secondary"])
+
+def _draw_room_background(draw, size, colors):
+    """Draw room background."""
+    width, height = size
+    
+    # Draw floor
+    draw.rectangle([0, height * 0.7, width, height], fill=colors["accent"])
+    
+    # Draw walls with perspective
+    # Left wall
+    draw.polygon([0, 0, width * 0.2, height * 0.2, width * 0.2, height * 0.8, 0, height], 
+                fill=colors["secondary"])
+    
+    # Back wall
+    draw.rectangle([width * 0.2, height * 0.2, width * 0.8, height * 0.8], 
+                  fill=colors["primary"])
+    
+    # Right wall
+    draw.polygon([width, 0, width * 0.8, height * 0.2, width * 0.8, height * 0.8, width, height], 
+                fill=colors["secondary"])
+
+def _draw_mountain_sky(image, size, colors):
+    """Draw mountain sky gradient, built as one pixel array instead of a line per row."""
+    width, height = size
+    sky_height = height // 2
+    alpha = (np.arange(sky_height) / sky_height)[:, None]
+    rows = np.array(colors["background"][:3]) * (1 - alpha) + np.array(colors["accent"][:3]) * alpha
+    sky = np.broadcast_to(rows.astype(np.uint8)[:, None, :], (sky_height, width, 3))
+    image.paste(Image.fromarray(np.ascontiguousarray(sky), "RGB"), (0, 0))
+
+def _draw_landscape_background(draw, size, colors):
+    """Draw general landscape background."""
+    width, height = size
+    
+    # Draw ground
+    draw.rectangle([0, height * 0.6, width, height], fill=colors["secondary"])
+    
+    # Draw hills
+    hill_xs = np.arange(0, width, 50)
+    for i in range(3):
+        y_base = height * 0.6 + i * 20
+        hill_ys = y_base - np.sin(hill_xs * 0.01 + i) * 30
+        
+        hill_points = np.column_stack([hill_xs, hill_ys]).ravel().tolist()
+        hill_points.extend([width, height, 0, height])
+        draw.polygon(hill_points, fill=colors["primary"])
+
+@lru_cache(maxsize=32)
+def _rendered_background_pixels(setting: str, palette_items: Tuple[Tuple[str, tuple], ...], size: Tuple[int, int]) -> bytes:
+    """Raw RGB pixels of the deterministic part of a setting background.
+    
+    Rendered once per palette and size; cached as bytes so the shared value can't be drawn on.
+    """
+    colors = dict(palette_items)
+    width, height = size
+    image = Image.new('RGB', size, colors["background"][:3])
+    draw = ImageDraw.Draw(image)
+    
+    if setting == "forest":
+        # Draw ground
+        draw.rectangle([0, height * 0.7, width, height], fill=colors["secondary"])
+    elif setting == "castle":
+        _draw_castle_base(draw, size, colors)
+    elif setting == "room":
+        _draw_room_background(draw, size, colors)
+    elif setting == "mountain":
+        _draw_mountain_sky(image, size, colors)
+    elif setting == "ocean":
+        # Draw sky
+        draw.rectangle([0, 0, width, height * 0.4], fill=colors["background"])
+    else:
+        _draw_landscape_background(draw, size, colors)
+    
+    return image.tobytes()
+
+def _rendered_background(setting: str, palette_items: Tuple[Tuple[str, tuple], ...], size: Tuple[int, int]) -> Image.Image:
+    """Read-only image over the cached background pixels, for pasting onto a canvas."""
+    return Image.frombuffer('RGB', size, _rendered_background_pixels(setting, palette_items, size), 'raw', 'RGB', 0, 1)
+
 class ImageGenerationService:
     def __init__(self):
         self.stability_api_key = settings.STABILITY_AI_API_KEY
         self.gemini_api_key = settings.GEMINI_API_KEY
         self.max_retries = settings.MAX_IMAGE_GENERATION_RETRIES
-        
+        # Request headers only depend on the API keys, so build them once
+        self._gemini_headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.gemini_api_key
+        }
+        self._stability_headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.stability_api_key}"
+        }
+        # Entries are full data URLs, so the local store is bounded by size rather than count alone
+        self._cache = ResponseCache("img", max_bytes=settings.IMAGE_CACHE_MAX_BYTES)
+        # Caps concurrent outbound calls to the image/prompt APIs across all requests
+        self._api_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_IMAGE_REQUESTS)
+        # Shared client so Gemini/Stability calls reuse pooled keep-alive connections
+        self._client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(120),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=settings.MAX_CONCURRENT_IMAGE_REQUESTS)
+        )
+        # Shared generator for procedural rendering; each shape's random parameters are drawn in one batch
+        self._rng = np.random.default_rng()
+        # Fallback images never change, so render and encode them once
+        self._fallback_story_data_url = self._build_fallback_story_image()
+        self._fallback_data_url = self._build_fallback_image()
+        # Rendered static elements: (element_type, emotion) -> data URL, oldest first
+        self._static_element_images: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        # Background image jobs: job_id -> status record, oldest first
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._job_tasks = set()
+        
+    async def aclose(self) -> None:
+        """Close the shared HTTP client."""
+        await self._client.aclose()
+    
     async def generate_sanctuary_image(
         self, 
         element_type: str, 
@@ -26,12 +982,23 @@ class ImageGenerationService:
     ) -> Optional[str]:
         """Generate sanctuary element image using Gemini API."""
         try:
+            if len(journal_entry.strip()) < _MIN_IMAGE_TEXT_LENGTH:
+                logger.info("Journal entry too short for AI generation, using procedural image")
+                return await self._generate_procedural_image(element_type, emotion)
+            
+            # Serve identical requests from cache to skip the paid API round-trip
+            cache_key = self._cache.make_key(element_type, emotion, style, normalize_cache_text(journal_entry))
+            cached_url = await self._cache.get(cache_key)
+            if cached_url:
+                logger.info("Serving sanctuary image from cache")
+                return cached_url
+            
             # Create enhanced prompt
             prompt = self._create_enhanced_prompt(element_type, emotion, journal_entry, style)
             
             if self.gemini_api_key:
                 # Try Gemini API first (enhance prompt)
-                enhanced_prompt = await self._enhance_prompt_with_gemini(prompt, journal_entry)
+                enhanced_prompt = await self._enhance_prompt_within_budget(prompt, journal_entry)
                 if enhanced_prompt:
                     prompt = enhanced_prompt
             
@@ -39,9 +1006,12 @@ class ImageGenerationService:
                 # Try Stability AI with enhanced prompt
                 image_url = await self._generate_with_stability(prompt)
                 if image_url:
+                    await self._cache.set(cache_key, image_url, settings.IMAGE_CACHE_TTL)
                     return image_url
             
-            # Final fallback to procedural generation
+            # Final fallback to procedural generation. It is only rendered once the remote
+            # path has failed: a render takes milliseconds, and a speculative one can't be
+            # cancelled once its worker thread is running
             logger.info("Falling back to procedural image generation")
             return await self._generate_procedural_image(element_type, emotion)
             
@@ -62,6 +1032,16 @@ class ImageGenerationService:
             logger.info(f"🔑 Gemini API key available: {bool(self.gemini_api_key)}")
             logger.info(f"🔑 Stability AI key available: {bool(self.stability_api_key)}")
             
+            if len(story_content.strip()) < _MIN_IMAGE_TEXT_LENGTH:
+                logger.info("🔄 Story content too short for AI generation, using curated image fallback")
+                return self._generate_high_quality_fallback(story_content, story_title, theme)
+            
+            cache_key = self._cache.make_key("story", theme, style, normalize_cache_text(story_content))
+            cached_url = await self._cache.get(cache_key)
+            if cached_url:
+                logger.info("✅ Serving story image from cache")
+                return cached_url
+            
             # Create story-specific prompt
             prompt = self._create_story_prompt(story_content, story_title, style, theme)
             logger.info(f"📝 Base prompt: {prompt[:100]}...")
@@ -69,7 +1049,7 @@ class ImageGenerationService:
             # Use Gemini to enhance the prompt for better image generation
             if self.gemini_api_key:
                 logger.info("🤖 Enhancing image prompt with Gemini AI")
-                enhanced_prompt = await self._enhance_prompt_with_gemini(prompt, story_content)
+                enhanced_prompt = await self._enhance_prompt_within_budget(prompt, story_content)
                 if enhanced_prompt:
                     prompt = enhanced_prompt
                     logger.info(f"✨ Enhanced prompt: {prompt[:100]}...")
@@ -84,6 +1064,7 @@ class ImageGenerationService:
                 image_url = await self._generate_with_stability(prompt, image_type="story")
                 if image_url:
                     logger.info("✅ Successfully generated image with Stability AI!")
+                    await self._cache.set(cache_key, image_url, settings.IMAGE_CACHE_TTL)
                     return image_url
                 else:
                     logger.warning("❌ Stability AI generation failed")
@@ -92,599 +1073,99 @@ class ImageGenerationService:
             
             # Use high-quality fallback
             logger.info("🔄 Using high-quality curated image fallback")
-            return await self._generate_high_quality_fallback(story_content, story_title, theme)
+            return self._generate_high_quality_fallback(story_content, story_title, theme)
             
         except Exception as e:
             logger.error(f"Error generating story image: {e}")
-            return await self._generate_high_quality_fallback(story_content, story_title, theme)
+            return self._generate_high_quality_fallback(story_content, story_title, theme)
+    
+    def enqueue_sanctuary_image(self, **kwargs) -> str:
+        """Start generate_sanctuary_image in the background and return its job id."""
+        return self._enqueue_job(self.generate_sanctuary_image(**kwargs))
+    
+    def enqueue_story_image(self, **kwargs) -> str:
+        """Start generate_story_image in the background and return its job id."""
+        return self._enqueue_job(self.generate_story_image(**kwargs))
+    
+    def get_image_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the status record of a background image job, or None if unknown."""
+        return self._jobs.get(job_id)
+    
+    def _enqueue_job(self, coro) -> str:
+        """Run an image generation coroutine as a tracked background task."""
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {"job_id": job_id, "status": "pending", "image_url": None}
+        
+        # Forget the oldest finished jobs once the registry is full; pending jobs are
+        # skipped so they stay pollable, even when they sit at the head
+        excess = len(self._jobs) - settings.MAX_TRACKED_IMAGE_JOBS
+        if excess > 0:
+            finished_ids = islice(
+                (tracked_id for tracked_id, job in self._jobs.items() if job["status"] != "pending"),
+                excess
+            )
+            for finished_id in list(finished_ids):
+                del self._jobs[finished_id]
+        
+        task = asyncio.create_task(self._run_job(job_id, coro))
+        self._job_tasks.add(task)  # Keep a reference so the task isn't garbage collected
+        task.add_done_callback(self._job_tasks.discard)
+        return job_id
     
-    async def _generate_high_quality_fallback(self, story_content: str, story_title: str, theme: str) -> str:
+    async def _run_job(self, job_id: str, coro) -> None:
+        """Await a background job and record its outcome."""
+        job = self._jobs.get(job_id, {})
+        try:
+            image_url = await coro
+            job["image_url"] = image_url
+            job["status"] = "completed" if image_url else "failed"
+        except Exception as e:
+            logger.error(f"Image job {job_id} failed: {e}")
+            job["status"] = "failed"
+    
+    def _generate_high_quality_fallback(self, story_content: str, story_title: str, theme: str) -> str:
         """Generate high-quality fallback image using curated image sources."""
         try:
             # Extract key visual elements from story content
-            visual_elements = self._extract_visual_elements_for_fallback(story_content, theme)
-            
             # Use Unsplash with carefully selected keywords for high-quality results
-            primary_keyword = visual_elements.get('primary', 'fantasy landscape')
-            secondary_keyword = visual_elements.get('secondary', 'cinematic')
-            
-            # Create high-quality Unsplash URL
-            keywords = f"{primary_keyword},{secondary_keyword},{theme}"
-            
-            # Use specific collections or photographers known for high-quality fantasy/story images
-            collections = "1114848,1127901,3356108"  # High-quality landscape/fantasy collections
+            primary_keyword, secondary_keyword = self._extract_visual_elements_for_fallback(story_content, theme)
             
-            fallback_url = f"https://source.unsplash.com/1344x768/?{keywords}&collections={collections}"
+            # Create high-quality Unsplash URL, percent-encoding the search terms
+            keywords = quote(f"{primary_keyword},{secondary_keyword},{theme}", safe=",")
+            fallback_url = f"{_UNSPLASH_BASE}?{keywords}&{_UNSPLASH_COLLECTIONS_QUERY}"
             
             logger.info(f"Using high-quality fallback image: {fallback_url}")
             return fallback_url
             
         except Exception as e:
             logger.error(f"Error generating high-quality fallback: {e}")
-            return "https://source.unsplash.com/1344x768/?fantasy,landscape,cinematic"
+            return f"{_UNSPLASH_BASE}?fantasy,landscape,cinematic"
     
-    def _extract_visual_elements_for_fallback(self, story_content: str, theme: str) -> dict:
-        """Extract visual elements optimized for realistic image search."""
-        content_lower = story_content.lower()
-        
-        # High-quality visual keywords for different themes
-        theme_keywords = {
-            "adventure": {
-                "primary": "mountain landscape adventure",
-                "secondary": "epic cinematic"
-            },
-            "mystery": {
-                "primary": "dark forest mysterious",
-                "secondary": "dramatic atmospheric"
-            },
-            "fantasy": {
-                "primary": "magical forest fantasy",
-                "secondary": "ethereal cinematic"
-            },
-            "romance": {
-                "primary": "beautiful garden romantic",
-                "secondary": "soft lighting"
-            },
-            "wisdom": {
-                "primary": "ancient library wisdom",
-                "secondary": "golden hour"
-            }
-        }
-        
-        # Location-based keywords
-        location_mapping = {
-            "forest": "dense forest trees",
-            "castle": "medieval castle architecture", 
-            "room": "elegant interior room",
-            "classroom": "ancient library classroom",
-            "school": "mystical academy interior",
-            "hall": "grand hall architecture",
-            "chamber": "ancient chamber interior",
-            "library": "ancient library books",
-            "temple": "sacred temple interior",
-            "mountain": "mountain landscape vista",
-            "ocean": "ocean waves seascape",
-            "cave": "mysterious cave entrance",
-            "garden": "beautiful garden flowers",
-            "village": "medieval village town",
-            "desert": "desert dunes landscape",
-            "river": "flowing river nature"
-        }
-        
-        # Character-based enhancements
-        character_enhancements = {
-            "traveler": "lone figure journey",
-            "hero": "heroic silhouette",
-            "teacher": "wise sage scholar",
-            "sage": "wise elder",
-            "warrior": "brave fighter",
-            "student": "young learner seeker",
-            "sam": "person figure silhouette"
-        }
-        
-        # Extract primary visual element
-        primary_visual = theme_keywords.get(theme, {}).get("primary", "fantasy landscape")
-        secondary_visual = theme_keywords.get(theme, {}).get("secondary", "cinematic")
-        
-        # Check for specific locations
-        for location, keyword in location_mapping.items():
-            if location in content_lower:
-                primary_visual = keyword
-                break
-        
-        # Check for characters
-        for character, enhancement in character_enhancements.items():
-            if character in content_lower:
-                secondary_visual = f"{secondary_visual} {enhancement}"
-                break
-        
-        # Add atmospheric elements
-        if "dark" in content_lower or "night" in content_lower:
-            secondary_visual = f"{secondary_visual} night dramatic"
-        elif "bright" in content_lower or "golden" in content_lower:
-            secondary_visual = f"{secondary_visual} golden hour"
-        elif "misty" in content_lower or "fog" in content_lower:
-            secondary_visual = f"{secondary_visual} misty atmospheric"
-        
-        return {
-            "primary": primary_visual,
-            "secondary": secondary_visual
-        }
+    def _extract_visual_elements_for_fallback(self, story_content: str, theme: str) -> Tuple[str, str]:
+        """Extract (primary, secondary) visual keywords optimized for realistic image search."""
+        return _fallback_visual_keywords(story_content, theme)
     
     def _create_enhanced_prompt(self, element_type: str, emotion: str, journal_entry: str, style: str) -> str:
         """Create enhanced prompt for image generation."""
-        # Base prompt templates
-        element_descriptions = {
-            "flower": "a beautiful, ethereal flower with delicate petals",
-            "tree": "a majestic, ancient tree with flowing branches", 
-            "crystal": "a luminous, mystical crystal formation",
-            "butterfly": "a graceful butterfly with iridescent wings",
-            "bird": "a serene bird perched peacefully",
-            "plant": "a lush, verdant plant with vibrant leaves",
-            "stone": "a smooth, weathered stone with natural patterns",
-            "water": "flowing, crystalline water with gentle ripples",
-            "cloud": "a soft, dreamy cloud formation",
-            "rock": "a solid, grounding rock formation",
-            "moss": "soft, green moss covering ancient surfaces",
-            "mist": "ethereal mist swirling gently",
-            "stream": "a peaceful stream with clear water",
-            "cave": "a mystical cave entrance with soft lighting",
-            "shadow": "gentle shadows creating depth and mystery",
-            "wind": "visible air currents creating movement"
-        }
-        
-        emotion_modifiers = {
-            "joy": "radiating golden light, warm and uplifting",
-            "love": "glowing with pink and rose tones, heart-warming",
-            "gratitude": "surrounded by warm, amber light",
-            "hope": "shimmering with silver and blue light",
-            "calm": "emanating peaceful, soft blue energy",
-            "sadness": "touched with gentle blue and purple hues",
-            "anger": "flickering with controlled red energy",
-            "fear": "shrouded in protective, dark tones",
-            "anxiety": "surrounded by swirling, muted colors",
-            "neutral": "balanced with natural, earth tones"
-        }
-        
-        base_desc = element_descriptions.get(element_type, "a mystical sanctuary element")
-        emotion_mod = emotion_modifiers.get(emotion, "with gentle, natural energy")
-        
-        # Extract key themes from journal entry
-        themes = self._extract_visual_themes(journal_entry)
-        theme_desc = f", embodying themes of {', '.join(themes)}" if themes else ""
-        
-        style_suffix = {
-            "fantasy-art": ", fantasy art style, magical realism, soft lighting, 4k quality",
-            "nature": ", natural photography style, organic, soft focus",
-            "abstract": ", abstract art style, flowing forms, artistic interpretation",
-            "watercolor": ", watercolor painting style, soft edges, artistic",
-            "digital-art": ", digital art style, clean lines, modern aesthetic"
-        }
-        
-        prompt = f"{base_desc} {emotion_mod}{theme_desc}{style_suffix.get(style, '')}"
-        
-        # Add quality and style modifiers
-        prompt += ", peaceful sanctuary setting, therapeutic atmosphere, high quality, detailed"
-        
-        return prompt
+        return _build_enhanced_prompt(element_type, emotion, journal_entry, style)
     
     def _create_story_prompt(self, story_content: str, story_title: str, style: str, theme: str) -> str:
         """Create dynamic story-specific prompt based on actual story content."""
-        # Extract key elements from the actual story content dynamically
-        characters = self._extract_story_characters(story_content)
-        settings = self._extract_story_settings(story_content)
-        actions = self._extract_story_actions(story_content)
-        emotions = self._extract_story_emotions(story_content)
-        objects = self._extract_story_objects(story_content)
-        
-        # Build dynamic prompt from actual story elements
-        prompt_parts = []
-        
-        # Add characters if found
-        if characters:
-            if len(characters) == 1:
-                prompt_parts.append(f"a person named {characters[0]}")
-            else:
-                prompt_parts.append(f"people including {', '.join(characters[:2])}")
-        
-        # Add primary action/scene
-        if actions:
-            primary_action = actions[0]
-            if "enter" in primary_action:
-                prompt_parts.append("entering")
-            elif "walk" in primary_action:
-                prompt_parts.append("walking through")
-            elif "sit" in primary_action:
-                prompt_parts.append("seated in")
-            elif "stand" in primary_action:
-                prompt_parts.append("standing in")
-            elif "discover" in primary_action:
-                prompt_parts.append("discovering")
-            elif "meet" in primary_action:
-                prompt_parts.append("meeting with")
-            else:
-                prompt_parts.append(primary_action)
-        
-        # Add setting/location
-        if settings:
-            primary_setting = settings[0]
-            prompt_parts.append(primary_setting)
-        else:
-            # Fallback based on theme if no specific setting found
-            theme_settings = {
-                "wisdom": "an ancient library or study",
-                "adventure": "a mystical landscape",
-                "mystery": "a shadowy, atmospheric place",
-                "fantasy": "a magical realm",
-                "meditation": "a peaceful, serene environment"
-            }
-            prompt_parts.append(theme_settings.get(theme, "a cinematic scene"))
-        
-        # Add emotional atmosphere
-        if emotions:
-            emotion_modifiers = {
-                "wise": "with ancient wisdom and golden light",
-                "peaceful": "with serene, calming atmosphere",
-                "mysterious": "with dramatic shadows and intrigue",
-                "magical": "with ethereal, mystical energy",
-                "powerful": "with strength and determination",
-                "gentle": "with soft, warm lighting",
-                "ancient": "with timeless, sacred atmosphere"
-            }
-            for emotion in emotions:
-                if emotion in emotion_modifiers:
-                    prompt_parts.append(emotion_modifiers[emotion])
-                    break
-        
-        # Add objects if significant
-        if objects:
-            significant_objects = [obj for obj in objects if obj in [
-                "scroll", "book", "desk", "door", "window", "chair", "table", 
-                "candle", "lamp", "mirror", "painting", "sword", "staff"
-            ]]
-            if significant_objects:
-                prompt_parts.append(f"with {significant_objects[0]} visible")
-        
-        # Construct the main prompt
-        base_prompt = " ".join(prompt_parts)
-        
-        # Add style-specific enhancements
-        style_enhancements = {
-            "fantasy-art": "fantasy art style, magical realism, cinematic lighting",
-            "realistic": "photorealistic, natural lighting, detailed",
-            "artistic": "artistic illustration, painterly style",
-            "watercolor": "watercolor painting, soft edges, artistic",
-            "digital-art": "digital art, clean composition, modern",
-            "cinematic": "cinematic composition, dramatic lighting, film-like"
-        }
-        
-        style_enhancement = style_enhancements.get(style, "cinematic lighting, artistic")
-        
-        # Add theme-specific atmosphere
-        theme_atmospheres = {
-            "adventure": "epic adventure atmosphere, heroic composition",
-            "mystery": "mysterious atmosphere, dramatic shadows",
-            "romance": "romantic lighting, soft warm tones",
-            "fantasy": "magical fantasy world, ethereal elements",
-            "wisdom": "scholarly atmosphere, golden hour lighting",
-            "meditation": "peaceful, contemplative mood",
-            "transformation_and_growth": "uplifting, transformative lighting",
-            "connection_and_belonging": "warm, welcoming atmosphere"
-        }
-        
-        theme_atmosphere = theme_atmospheres.get(theme, "atmospheric, cinematic")
-        
-        # Final prompt assembly
-        final_prompt = f"{base_prompt}, {style_enhancement}, {theme_atmosphere}, high quality, detailed, immersive"
-        
-        # Clean up the prompt
-        final_prompt = final_prompt.replace("  ", " ").strip()
-        
-        return final_prompt
-    
-    def _extract_story_characters(self, story_content: str) -> list:
-        """Extract character names and descriptions from any story content dynamically."""
-        characters = []
-        text_lower = story_content.lower()
-        text_original = story_content
-        
-        # Extract proper nouns that could be names (capitalized words)
-        import re
-        potential_names = re.findall(r'\b[A-Z][a-z]+\b', text_original)
-        
-        # Filter out common non-name words
-        common_words = {
-            'The', 'And', 'But', 'For', 'Or', 'A', 'An', 'This', 'That', 'With', 'Through',
-            'Every', 'Story', 'They', 'Said', 'Your', 'Tale', 'Sam', 'Max', 'Alex', 'Jordan',
-            'Ancient', 'Scroll', 'Wisdom', 'Ages', 'Truth', 'Classroom', 'Teacher', 'Contribution'
-        }
-        
-        # Add actual names found in text
-        for name in potential_names:
-            if name not in common_words and len(name) > 2:
-                # Check if it appears to be used as a name (preceded by common name indicators)
-                name_patterns = [
-                    rf'\b{name} (enters|walks|sits|stands|goes|comes|looks|speaks|says)',
-                    rf'\b(said|called|named) {name}\b',
-                    rf'\b{name}\'s\b',
-                    rf'\b{name} (was|is|had|has)\b'
-                ]
-                
-                for pattern in name_patterns:
-                    if re.search(pattern, story_content, re.IGNORECASE):
-                        characters.append(name)
-                        break
-        
-        # Common character references
-        character_references = {
-            'teacher': 'wise teacher',
-            'sage': 'ancient sage', 
-            'student': 'student',
-            'traveler': 'traveler',
-            'hero': 'hero',
-            'warrior': 'warrior',
-            'guide': 'guide',
-            'master': 'master',
-            'scholar': 'scholar',
-            'seeker': 'seeker',
-            'wanderer': 'wanderer'
-        }
-        
-        for ref, description in character_references.items():
-            if ref in text_lower and description not in characters:
-                characters.append(description)
-        
-        # Generic character indicators
-        pronouns_found = []
-        if re.search(r'\bhe\b|\bhim\b|\bhis\b', text_lower):
-            pronouns_found.append('a man')
-        if re.search(r'\bshe\b|\bher\b|\bhers\b', text_lower):
-            pronouns_found.append('a woman')
-        if re.search(r'\bthey\b|\bthem\b|\btheir\b', text_lower) and not characters:
-            pronouns_found.append('people')
-        
-        # Add pronouns only if no specific characters found
-        if not characters and pronouns_found:
-            characters.extend(pronouns_found)
-        
-        return list(set(characters))[:3]  # Limit to 3 main characters
-    
-    def _extract_story_settings(self, story_content: str) -> list:
-        """Extract setting descriptions from any story content dynamically."""
-        settings = []
-        text_lower = story_content.lower()
-        
-        # Comprehensive location detection
-        location_keywords = {
-            "classroom": ["classroom", "class", "school room"],
-            "library": ["library", "archive", "book hall"],
-            "forest": ["forest", "woods", "woodland", "trees", "grove"],
-            "castle": ["castle", "fortress", "palace", "tower", "citadel"],
-            "village": ["village", "town", "marketplace", "square", "hamlet"],
-            "mountain": ["mountain", "peak", "cliff", "valley", "hill"],
-            "ocean": ["ocean", "sea", "beach", "shore", "waves", "coast"],
-            "cave": ["cave", "cavern", "underground", "tunnel", "grotto"],
-            "room": ["room", "chamber", "hall", "study", "parlor"],
-            "garden": ["garden", "meadow", "field", "flowers", "courtyard"],
-            "city": ["city", "street", "urban", "buildings", "plaza"],
-            "desert": ["desert", "sand", "dunes", "oasis", "wasteland"],
-            "temple": ["temple", "shrine", "sanctuary", "sacred place"],
-            "bridge": ["bridge", "crossing", "walkway"],
-            "path": ["path", "road", "trail", "pathway", "route"],
-            "door": ["doorway", "entrance", "threshold", "gate"],
-            "window": ["window", "opening", "view"],
-            "stairs": ["stairs", "staircase", "steps"],
-            "attic": ["attic", "loft", "upper room"],
-            "basement": ["basement", "cellar", "lower level"],
-            "kitchen": ["kitchen", "dining room"],
-            "bedroom": ["bedroom", "sleeping chamber"],
-            "office": ["office", "workspace", "study"]
-        }
-        
-        # Find all matching locations
-        found_locations = []
-        for location, keywords in location_keywords.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    if location == "room" and any(specific in text_lower for specific in ["class", "bed", "dining", "living"]):
-                        continue  # Skip generic "room" if more specific room found
-                    found_locations.append(location)
-                    break
-        
-        # Convert to descriptive settings
-        location_descriptions = {
-            "classroom": "ancient classroom with wooden desks and mystical atmosphere",
-            "library": "grand library with towering bookshelves",
-            "forest": "mystical forest with ancient trees",
-            "castle": "medieval castle with stone walls",
-            "village": "quaint medieval village",
-            "mountain": "majestic mountain landscape",
-            "ocean": "vast ocean with rolling waves",
-            "cave": "mysterious cave with natural formations",
-            "room": "elegant interior room",
-            "garden": "beautiful garden with flowers",
-            "city": "bustling medieval city",
-            "desert": "vast desert landscape",
-            "temple": "sacred temple with ancient architecture",
-            "bridge": "old stone bridge",
-            "path": "winding path through nature",
-            "door": "ornate doorway",
-            "window": "arched window with view",
-            "stairs": "grand staircase",
-            "attic": "cozy attic space",
-            "basement": "stone basement chamber",
-            "kitchen": "rustic kitchen",
-            "bedroom": "comfortable bedroom",
-            "office": "scholarly study room"
-        }
-        
-        # Add descriptions for found locations
-        for location in found_locations:
-            if location in location_descriptions:
-                settings.append(location_descriptions[location])
-        
-        # Look for atmospheric descriptors
-        atmosphere_indicators = {
-            "ancient": "ancient",
-            "old": "old",
-            "dark": "shadowy",
-            "bright": "brightly lit",
-            "mysterious": "mysterious",
-            "peaceful": "peaceful",
-            "sacred": "sacred",
-            "hidden": "hidden",
-            "secret": "secret",
-            "magical": "magical",
-            "enchanted": "enchanted"
-        }
-        
-        found_atmosphere = []
-        for indicator, description in atmosphere_indicators.items():
-            if indicator in text_lower:
-                found_atmosphere.append(description)
-        
-        # Combine settings with atmosphere
-        if settings and found_atmosphere:
-            settings[0] = f"{found_atmosphere[0]} {settings[0]}"
-        elif not settings and found_atmosphere:
-            settings.append(f"{found_atmosphere[0]} interior space")
-        elif not settings:
-            # Default atmospheric setting
-            settings.append("cinematic interior scene")
-        
-        return settings[:2]  # Return top 2 settings
-    
-    def _extract_story_actions(self, story_content: str) -> list:
-        """Extract key actions from any story content dynamically."""
-        actions = []
-        text_lower = story_content.lower()
-        
-        # Comprehensive action detection
-        action_patterns = {
-            "entering": r'\b(enter|enters|entering|walked into|steps into|goes into)\b',
-            "walking": r'\b(walk|walks|walking|stroll|strolls|pace|paces)\b',
-            "sitting": r'\b(sit|sits|sitting|seated|settles)\b',
-            "standing": r'\b(stand|stands|standing|stood|rise|rises)\b',
-            "looking": r'\b(look|looks|looking|gaze|gazes|stare|stares)\b',
-            "speaking": r'\b(speak|speaks|speaking|talk|talks|say|says|said)\b',
-            "smiling": r'\b(smile|smiles|smiling|grin|grins)\b',
-            "gesturing": r'\b(gesture|gestures|gesturing|point|points|wave|waves)\b',
-            "reading": r'\b(read|reads|reading|study|studies|examine|examines)\b',
-            "writing": r'\b(write|writes|writing|scribe|scribes)\b',
-            "discovering": r'\b(discover|discovers|find|finds|uncover|uncovers)\b',
-            "exploring": r'\b(explore|explores|exploring|search|searches|investigate)\b',
-            "meeting": r'\b(meet|meets|meeting|encounter|encounters|greet|greets)\b',
-            "learning": r'\b(learn|learns|learning|understand|understands|realize|realizes)\b',
-            "teaching": r'\b(teach|teaches|teaching|instruct|instructs|guide|guides)\b',
-            "traveling": r'\b(travel|travels|traveling|journey|journeys|move|moves)\b',
-            "opening": r'\b(open|opens|opening|unlock|unlocks)\b',
-            "closing": r'\b(close|closes|closing|shut|shuts)\b',
-            "creating": r'\b(create|creates|creating|make|makes|build|builds)\b',
-            "transforming": r'\b(transform|transforms|change|changes|become|becomes)\b'
-        }
-        
-        import re
-        found_actions = []
-        for action, pattern in action_patterns.items():
-            if re.search(pattern, text_lower):
-                found_actions.append(action)
-        
-        # Prioritize more specific actions
-        action_priority = [
-            "entering", "discovering", "transforming", "teaching", "learning", 
-            "meeting", "creating", "gesturing", "smiling", "speaking",
-            "reading", "writing", "exploring", "traveling", "opening",
-            "walking", "standing", "sitting", "looking", "closing"
-        ]
-        
-        # Sort found actions by priority
-        prioritized_actions = []
-        for priority_action in action_priority:
-            if priority_action in found_actions:
-                prioritized_actions.append(priority_action)
-        
-        # Add any remaining actions not in priority list
-        for action in found_actions:
-            if action not in prioritized_actions:
-                prioritized_actions.append(action)
-        
-        return prioritized_actions[:2]  # Return top 2 actions
+        return _build_story_prompt(story_content, story_title, style, theme)
     
-    def _extract_story_emotions(self, story_content: str) -> list:
-        """Extract emotional atmosphere from story content."""
-        emotions = []
-        text_lower = story_content.lower()
-        
-        emotion_keywords = {
-            "wise": ["wise", "wisdom", "sage", "ancient", "knowing"],
-            "peaceful": ["peaceful", "calm", "serene", "tranquil", "still"],
-            "mysterious": ["mysterious", "mystery", "enigmatic", "cryptic"],
-            "magical": ["magical", "mystical", "enchanted", "ethereal"],
-            "powerful": ["powerful", "strong", "mighty", "commanding"],
-            "gentle": ["gentle", "soft", "tender", "kind"],
-            "ancient": ["ancient", "old", "timeless", "eternal"],
-            "sacred": ["sacred", "holy", "blessed", "divine"],
-            "warm": ["warm", "cozy", "welcoming", "comfortable"],
-            "dramatic": ["dramatic", "intense", "striking", "bold"]
-        }
-        
-        for emotion, keywords in emotion_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                emotions.append(emotion)
-        
-        return emotions[:2]  # Return top 2 emotions
-    
-    def _extract_story_objects(self, story_content: str) -> list:
-        """Extract significant objects from story content."""
-        objects = []
-        text_lower = story_content.lower()
-        
-        significant_objects = {
-            "scroll": ["scroll", "parchment", "manuscript"],
-            "book": ["book", "tome", "volume", "text"],
-            "desk": ["desk", "table", "surface"],
-            "chair": ["chair", "seat", "throne"],
-            "door": ["door", "doorway", "entrance", "portal"],
-            "window": ["window", "opening"],
-            "candle": ["candle", "flame", "light"],
-            "lamp": ["lamp", "lantern", "torch"],
-            "mirror": ["mirror", "reflection", "glass"],
-            "painting": ["painting", "portrait", "artwork"],
-            "staff": ["staff", "wand", "rod"],
-            "crystal": ["crystal", "gem", "jewel"],
-            "tree": ["tree", "oak", "pine", "willow"],
-            "flower": ["flower", "rose", "bloom", "blossom"],
-            "stone": ["stone", "rock", "boulder"],
-            "water": ["water", "stream", "river", "pond"]
-        }
+    async def _enhance_prompt_within_budget(self, base_prompt: str, content: str) -> Optional[str]:
+        """Gemini-enhanced prompt, or None if enhancement fails or overruns IMAGE_ENHANCE_TIMEOUT.
         
-        for obj, keywords in significant_objects.items():
-            if any(keyword in text_lower for keyword in keywords):
-                objects.append(obj)
-        
-        return objects[:3]  # Return top 3 objects
-    
-    def _extract_visual_themes(self, journal_entry: str) -> list:
-        """Extract visual themes from journal entry for image generation."""
-        themes = []
-        text_lower = journal_entry.lower()
-        
-        visual_themes = {
-            "growth": ["growing", "blooming", "flourishing"],
-            "strength": ["strong", "powerful", "resilient"],
-            "peace": ["peaceful", "calm", "serene"], 
-            "transformation": ["changing", "becoming", "evolving"],
-            "connection": ["together", "connected", "unity"],
-            "healing": ["healing", "recovery", "restoration"],
-            "freedom": ["free", "liberated", "soaring"],
-            "protection": ["safe", "protected", "sheltered"]
-        }
-        
-        for theme, keywords in visual_themes.items():
-            if any(keyword in text_lower for keyword in keywords):
-                themes.append(theme)
-        
-        return themes[:3]  # Limit to 3 themes
+        Stability can't start until the prompt is settled, so a slow enhancement (up to
+        several timed-out retries) would otherwise add its full latency to every image.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._enhance_prompt_with_gemini(base_prompt, content), settings.IMAGE_ENHANCE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini prompt enhancement took over {settings.IMAGE_ENHANCE_TIMEOUT}s, using the base prompt")
+            return None
     
     async def _enhance_prompt_with_gemini(self, base_prompt: str, story_content: str) -> Optional[str]:
         """Use Gemini to enhance image generation prompts for better visual quality."""
@@ -697,61 +1178,37 @@ class ImageGenerationService:
             enhancement_request = {
                 "contents": [{
                     "parts": [{
-                        "text": f"""You are an expert at creating detailed, cinematic image generation prompts. 
-
-Analyze this story content and create a vivid visual scene:
-Story Content: "{story_content}"
-Basic Prompt: "{base_prompt}"
-
-Instructions:
-1. Read the story content carefully and identify the key visual elements:
-   - Who are the characters? (names, descriptions, roles)
-   - Where does this scene take place? (specific location, atmosphere)
-   - What is happening? (actions, interactions, emotions)
-   - What objects or details are important?
-
-2. Create a detailed image prompt that includes:
-   - Character descriptions (age, appearance, clothing, pose)
-   - Specific setting details (architecture, furniture, lighting, atmosphere)
-   - Mood and lighting (golden hour, candlelight, natural light, shadows)
-   - Artistic style (cinematic, realistic, fantasy art, dramatic)
-   - Color palette (warm/cool tones, specific colors mentioned)
-   - Composition (foreground/background, perspective, depth of field)
-
-3. Make it cinematic and atmospheric while staying true to the story content.
-4. Focus on creating a scene that feels alive and immersive.
-5. If characters are mentioned by name, include them naturally in the scene.
-
-Example of good prompt style:
-"A wise elderly teacher with gentle eyes and flowing robes, sitting behind an ornate wooden desk in an ancient library, gesturing toward an illuminated scroll, warm golden candlelight casting soft shadows, cinematic composition, fantasy art style, detailed and atmospheric"
-
-Return only the enhanced visual prompt, nothing else."""
+                        "text": _GEMINI_PROMPT_TEMPLATE.format_map({"story_content": story_content, "base_prompt": base_prompt})
                     }]
                 }]
             }
             
-            headers = {
-                "Content-Type": "application/json",
-                "x-goog-api-key": self.gemini_api_key
-            }
+            async def post():
+                async with self._api_semaphore:
+                    response = await self._client.post(
+                        _GEMINI_ENHANCE_URL, json=enhancement_request, headers=self._gemini_headers, timeout=30
+                    )
+                if response.status_code in _RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                return response
             
-            url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+            try:
+                response = await _with_backoff(post, max_retries=self.max_retries)
+            except httpx.HTTPStatusError as e:
+                response = e.response
             
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.post(url, json=enhancement_request, headers=headers)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("candidates") and len(data["candidates"]) > 0:
-                        enhanced_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-                        logger.info(f"Gemini enhanced prompt: {enhanced_text[:100]}...")
-                        return enhanced_text
-                    else:
-                        logger.warning("No candidates in Gemini response")
-                        return None
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("candidates") and len(data["candidates"]) > 0:
+                    enhanced_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+                    logger.info(f"Gemini enhanced prompt: {enhanced_text[:100]}...")
+                    return enhanced_text
                 else:
-                    logger.error(f"Gemini API error: {response.status_code} - {response.text}")
+                    logger.warning("No candidates in Gemini response")
                     return None
+            else:
+                logger.error(f"Gemini API error: {response.status_code} - {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"Error enhancing prompt with Gemini: {e}")
@@ -765,75 +1222,61 @@ Return only the enhanced visual prompt, nothing else."""
                 return None
             
             logger.info(f"🔗 Connecting to Stability AI API...")
-            url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
-            
-            headers = {
-                "Accept": "application/json",
-                "Content-Type": "application/json", 
-                "Authorization": f"Bearer {self.stability_api_key}"
-            }
             
             # Adjust parameters based on image type
-            if image_type == "story":
-                width, height = 1344, 768  # Valid SDXL dimension for story scenes
-                style_preset = "cinematic"
-                cfg_scale = 8
-                steps = 40  # More steps for better quality
-            else:
-                width, height = 1024, 1024  # Valid SDXL dimension for sanctuary elements
-                style_preset = "fantasy-art"
-                cfg_scale = 7
-                steps = 30
-            
-            # Enhanced negative prompt for better quality
-            negative_prompt = "blurry, low quality, distorted, ugly, nsfw, violent, text, watermark, cartoon, anime, childish, simple shapes, geometric, abstract art, low resolution, pixelated, artifact"
+            params = _STABILITY_STORY_PARAMS if image_type == "story" else _STABILITY_SANCTUARY_PARAMS
             
             body = {
                 "text_prompts": [
                     {
-                        "text": f"{prompt}, photorealistic, highly detailed, professional photography, cinematic lighting, 8k resolution, masterpiece",
+                        "text": f"{prompt}{_STABILITY_PROMPT_SUFFIX}",
                         "weight": 1
                     },
                     {
-                        "text": negative_prompt,
+                        "text": _STABILITY_NEGATIVE_PROMPT,
                         "weight": -1
                     }
                 ],
-                "cfg_scale": cfg_scale,
-                "height": height,
-                "width": width,
+                **params,
                 "samples": 1,
-                "steps": steps,
-                "style_preset": style_preset,
                 "seed": 0  # Random seed for variety
             }
             
-            async with httpx.AsyncClient(timeout=120) as client:  # Increased timeout
-                logger.info(f"🎨 Generating image with Stability AI...")
-                logger.info(f"📝 Prompt: {prompt[:100]}...")
-                logger.info(f"⚙️ Settings: {width}x{height}, {steps} steps, {style_preset} style")
-                
-                response = await client.post(url, headers=headers, json=body)
-                
-                logger.info(f"📡 Response status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("artifacts"):
-                        image_data = data["artifacts"][0]["base64"]
-                        logger.info("✅ Successfully generated image with Stability AI")
-                        return f"data:image/png;base64,{image_data}"
-                    else:
-                        logger.error("❌ No artifacts in Stability AI response")
-                elif response.status_code == 402:
-                    logger.error("❌ Stability AI API: Insufficient credits")
-                elif response.status_code == 429:
-                    logger.error("❌ Stability AI API: Rate limit exceeded")
+            logger.info(f"🎨 Generating image with Stability AI...")
+            logger.info(f"📝 Prompt: {prompt[:100]}...")
+            logger.info(f"⚙️ Settings: {params['width']}x{params['height']}, {params['steps']} steps, {params['style_preset']} style")
+            
+            async def post():
+                async with self._api_semaphore:
+                    response = await self._client.post(_STABILITY_TEXT_TO_IMAGE_URL, headers=self._stability_headers, json=body)
+                if response.status_code in _RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                return response
+            
+            try:
+                response = await _with_backoff(post, max_retries=self.max_retries, retry_timeouts=False)
+            except httpx.HTTPStatusError as e:
+                response = e.response
+            
+            logger.info(f"📡 Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("artifacts"):
+                    image_data = data["artifacts"][0]["base64"]
+                    logger.info("✅ Successfully generated image with Stability AI")
+                    return f"data:image/png;base64,{image_data}"
                 else:
-                    logger.error(f"❌ Stability AI API error: {response.status_code}")
-                    logger.error(f"📋 Error details: {response.text[:500]}")
-                
-                return None
+                    logger.error("❌ No artifacts in Stability AI response")
+            elif response.status_code == 402:
+                logger.error("❌ Stability AI API: Insufficient credits")
+            elif response.status_code == 429:
+                logger.error("❌ Stability AI API: Rate limit exceeded")
+            else:
+                logger.error(f"❌ Stability AI API error: {response.status_code}")
+                logger.error(f"📋 Error details: {response.text[:500]}")
+            
+            return None
                     
         except Exception as e:
             logger.error(f"❌ Error with Stability AI generation: {e}")
@@ -842,225 +1285,139 @@ Return only the enhanced visual prompt, nothing else."""
     async def _generate_procedural_story_image(self, story_content: str, theme: str) -> str:
         """Generate procedural story image when AI generation is not available."""
         try:
-            # Create image canvas with story aspect ratio
-            size = (1024, 768)
-            image = Image.new('RGBA', size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(image)
-            
-            # Get theme-based colors
-            color_palette = self._get_story_theme_colors(theme)
-            
-            # Draw background based on story content
-            settings = self._extract_story_settings(story_content)
-            if settings:
-                setting_type = settings[0].split()[-1] if settings else "landscape"
-                self._draw_story_background(draw, size, color_palette, setting_type)
-            else:
-                self._draw_story_background(draw, size, color_palette, "landscape")
-            
-            # Add atmospheric elements
-            self._add_story_atmosphere(draw, size, color_palette, theme)
-            
-            # Apply theme-based filters
-            image = self._apply_story_mood_filter(image, theme)
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
+            # Drawing and encoding are CPU-bound, so keep them off the event loop
+            return await asyncio.to_thread(self._render_procedural_story_image, story_content, theme)
             
         except Exception as e:
             logger.error(f"Error generating procedural story image: {e}")
             return self._generate_fallback_story_image()
     
-    def _get_story_theme_colors(self, theme: str) -> Dict[str, tuple]:
-        """Get color palette based on story theme."""
-        palettes = {
-            "adventure": {
-                "primary": (34, 139, 34),     # Forest green
-                "secondary": (255, 215, 0),   # Gold
-                "accent": (70, 130, 180),     # Steel blue
-                "background": (135, 206, 235)  # Sky blue
-            },
-            "mystery": {
-                "primary": (75, 0, 130),      # Indigo
-                "secondary": (128, 0, 128),   # Purple
-                "accent": (169, 169, 169),    # Dark gray
-                "background": (25, 25, 112)   # Midnight blue
-            },
-            "fantasy": {
-                "primary": (148, 0, 211),     # Dark violet
-                "secondary": (255, 20, 147),  # Deep pink
-                "accent": (0, 255, 255),      # Cyan
-                "background": (72, 61, 139)   # Dark slate blue
-            },
-            "romance": {
-                "primary": (255, 182, 193),   # Light pink
-                "secondary": (255, 105, 180), # Hot pink
-                "accent": (255, 228, 225),    # Misty rose
-                "background": (255, 240, 245)  # Lavender blush
-            }
-        }
+    def _render_procedural_story_image(self, story_content: str, theme: str) -> str:
+        """Draw and encode a procedural story image."""
+        # Create image canvas with story aspect ratio
+        size = (1024, 768)
+        image = Image.new('RGBA', size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
         
-        return palettes.get(theme, {
-            "primary": (34, 139, 34),     # Default green
-            "secondary": (255, 215, 0),   # Gold
-            "accent": (135, 206, 235),    # Sky blue
-            "background": (240, 248, 255) # Alice blue
-        })
-    
-    def _draw_story_background(self, draw, size, colors, setting_type):
-        """Draw story background based on setting type."""
-        width, height = size
+        # Get theme-based colors
+        color_palette = self._get_story_theme_colors(theme)
         
-        # Fill background
-        draw.rectangle([0, 0, width, height], fill=colors["background"])
+        # Draw background based on story content
+        settings = _extract_story_settings(_analyze_story(story_content))
+        if settings:
+            setting_type = settings[0].split()[-1] if settings else "landscape"
+            self._draw_story_background(image, draw, size, color_palette, setting_type)
+        else:
+            self._draw_story_background(image, draw, size, color_palette, "landscape")
+        
+        # Add atmospheric elements
+        self._add_story_atmosphere(draw, size, color_palette, theme)
         
+        # Apply theme-based filters
+        image = self._apply_story_mood_filter(image, theme)
+        
+        return _image_data_url(image)
+    
+    def _get_story_theme_colors(self, theme: str) -> Mapping[str, tuple]:
+        """Get color palette based on story theme."""
+        return _STORY_PALETTES.get(theme, _DEFAULT_STORY_PALETTE)
+    
+    def _draw_story_background(self, image, draw, size, colors, setting_type):
+        """Draw story background based on setting type."""
         if "forest" in setting_type:
-            self._draw_forest_background(draw, size, colors)
+            setting = "forest"
         elif "castle" in setting_type:
-            self._draw_castle_background(draw, size, colors)
+            setting = "castle"
         elif "room" in setting_type:
-            self._draw_room_background(draw, size, colors)
+            setting = "room"
         elif "mountain" in setting_type:
-            self._draw_mountain_background(draw, size, colors)
+            setting = "mountain"
         elif "ocean" in setting_type:
-            self._draw_ocean_background(draw, size, colors)
+            setting = "ocean"
         else:
-            self._draw_landscape_background(draw, size, colors)
+            setting = "landscape"
+        
+        # Blit the cached static layer, then draw the randomized shapes on top
+        image.paste(_rendered_background(setting, tuple(colors.items()), size), (0, 0))
+        
+        if setting == "forest":
+            self._draw_forest_background(draw, size, colors)
+        elif setting == "castle":
+            self._draw_castle_background(draw, size, colors)
+        elif setting == "mountain":
+            self._draw_mountain_background(draw, size, colors)
+        elif setting == "ocean":
+            self._draw_ocean_background(draw, size, colors)
     
     def _draw_forest_background(self, draw, size, colors):
-        """Draw forest background."""
+        """Draw forest trees over the static ground layer."""
         width, height = size
         
-        # Draw ground
-        draw.rectangle([0, height * 0.7, width, height], fill=colors["secondary"])
-        
         # Draw trees
-        for i in range(5):
+        trees = self._rng.integers((100, 40), (201, 81), size=(5, 2)).tolist()
+        rectangle, ellipse = draw.rectangle, draw.ellipse
+        trunk_color, crown_color = colors["accent"], colors["primary"]
+        trunk_width = 20
+        for i, (tree_height, crown_size) in enumerate(trees):
             x = (width // 6) * (i + 1)
-            tree_height = random.randint(100, 200)
-            trunk_width = 20
             
             # Trunk
-            draw.rectangle([x - trunk_width//2, height - tree_height, 
-                           x + trunk_width//2, height], fill=colors["accent"])
+            rectangle([x - trunk_width//2, height - tree_height, 
+                      x + trunk_width//2, height], fill=trunk_color)
             
             # Crown
-            crown_size = random.randint(40, 80)
-            draw.ellipse([x - crown_size, height - tree_height - crown_size//2,
-                         x + crown_size, height - tree_height + crown_size//2], 
-                        fill=colors["primary"])
+            ellipse([x - crown_size, height - tree_height - crown_size//2,
+                    x + crown_size, height - tree_height + crown_size//2], 
+                   fill=crown_color)
     
     def _draw_castle_background(self, draw, size, colors):
-        """Draw castle background."""
+        """Draw castle towers over the static silhouette layer."""
         width, height = size
-        
-        # Draw ground
-        draw.rectangle([0, height * 0.8, width, height], fill=colors["accent"])
-        
-        # Draw castle silhouette
         castle_width = width // 3
         castle_height = height // 2
         castle_x = width // 2 - castle_width // 2
         castle_y = height - castle_height
         
-        draw.rectangle([castle_x, castle_y, castle_x + castle_width, height], 
-                      fill=colors["secondary"])
-        
         # Draw towers
         tower_width = castle_width // 4
-        for i in range(3):
+        tower_heights = self._rng.integers(castle_height // 2, castle_height + 1, size=3).tolist()
+        rectangle, tower_color = draw.rectangle, colors["primary"]
+        for i, tower_height in enumerate(tower_heights):
             tower_x = castle_x + i * (castle_width // 3)
-            tower_height = random.randint(castle_height // 2, castle_height)
-            draw.rectangle([tower_x, castle_y - tower_height//2, 
-                           tower_x + tower_width, castle_y], 
-                          fill=colors["primary"])
-    
-    def _draw_room_background(self, draw, size, colors):
-        """Draw room background."""
-        width, height = size
-        
-        # Draw floor
-        draw.rectangle([0, height * 0.7, width, height], fill=colors["accent"])
-        
-        # Draw walls with perspective
-        # Left wall
-        draw.polygon([0, 0, width * 0.2, height * 0.2, width * 0.2, height * 0.8, 0, height], 
-                    fill=colors["secondary"])
-        
-        # Back wall
-        draw.rectangle([width * 0.2, height * 0.2, width * 0.8, height * 0.8], 
-                      fill=colors["primary"])
-        
-        # Right wall
-        draw.polygon([width, 0, width * 0.8, height * 0.2, width * 0.8, height * 0.8, width, height], 
-                    fill=colors["secondary"])
+            rectangle([tower_x, castle_y - tower_height//2, 
+                      tower_x + tower_width, castle_y], 
+                     fill=tower_color)
     
     def _draw_mountain_background(self, draw, size, colors):
-        """Draw mountain background."""
+        """Draw mountain silhouettes over the static sky layer."""
         width, height = size
         
-        # Draw sky gradient (simplified)
-        for i in range(height // 2):
-            alpha = i / (height // 2)
-            color = tuple(int(colors["background"][j] * (1 - alpha) + colors["accent"][j] * alpha) for j in range(3))
-            draw.line([0, i, width, i], fill=color)
-        
         # Draw mountain silhouettes
+        peak_xs = np.arange(0, width, 100)
         for layer in range(3):
             mountain_height = height // 3 + layer * 50
-            points = [0, height - mountain_height]
-            
-            for i in range(0, width, 100):
-                peak_height = random.randint(mountain_height - 50, mountain_height + 50)
-                points.extend([i, height - peak_height])
             
-            points.extend([width, height - mountain_height, width, height, 0, height])
+            peak_heights = self._rng.integers(mountain_height - 50, mountain_height + 51, size=peak_xs.size)
+            peaks = np.column_stack([peak_xs, height - peak_heights]).ravel().tolist()
+            points = [0, height - mountain_height, *peaks, width, height - mountain_height, width, height, 0, height]
             
             alpha = 100 + layer * 50
             color = (*colors["primary"], alpha) if len(colors["primary"]) == 3 else colors["primary"]
             draw.polygon(points, fill=color[:3])
     
     def _draw_ocean_background(self, draw, size, colors):
-        """Draw ocean background."""
+        """Draw ocean waves over the static sky layer."""
         width, height = size
         
-        # Draw sky
-        draw.rectangle([0, 0, width, height * 0.4], fill=colors["background"])
-        
-        # Draw ocean with waves
-        for i in range(height * 2 // 5, height, 10):
-            wave_color = tuple(min(255, c + random.randint(-30, 30)) for c in colors["primary"][:3])
-            points = []
-            for x in range(0, width, 20):
-                wave_y = i + math.sin(x * 0.02 + i * 0.1) * 5
-                points.extend([x, wave_y])
-            
-            if len(points) >= 4:
-                points.extend([width, height, 0, height])
-                draw.polygon(points, fill=wave_color)
-    
-    def _draw_landscape_background(self, draw, size, colors):
-        """Draw general landscape background."""
-        width, height = size
-        
-        # Draw ground
-        draw.rectangle([0, height * 0.6, width, height], fill=colors["secondary"])
-        
-        # Draw hills
-        for i in range(3):
-            hill_points = []
-            y_base = height * 0.6 + i * 20
-            
-            for x in range(0, width, 50):
-                hill_y = y_base - math.sin(x * 0.01 + i) * 30
-                hill_points.extend([x, hill_y])
+        # Draw ocean with waves, each band a randomly shifted shade of the primary color
+        wave_bands = _ocean_wave_points(width, height)
+        shifts = self._rng.integers(-30, 31, size=(len(wave_bands), 3))
+        wave_colors = np.minimum(255, np.array(colors["primary"][:3]) + shifts).tolist()
+        for band_points, wave_color in zip(wave_bands, wave_colors):
+            wave_color = tuple(wave_color)
             
-            hill_points.extend([width, height, 0, height])
-            draw.polygon(hill_points, fill=colors["primary"])
+            if len(band_points) >= 4:
+                draw.polygon([*band_points, width, height, 0, height], fill=wave_color)
     
     def _add_story_atmosphere(self, draw, size, colors, theme):
         """Add atmospheric elements based on theme."""
@@ -1068,34 +1425,28 @@ Return only the enhanced visual prompt, nothing else."""
         
         if theme == "mystery":
             # Add mist/fog effects
-            for i in range(5):
-                mist_x = random.randint(0, width)
-                mist_y = random.randint(height // 2, height)
-                mist_size = random.randint(50, 150)
-                
+            mists = self._rng.integers((0, height // 2, 50), (width + 1, height + 1, 151), size=(5, 3)).tolist()
+            mist_color = (*colors["accent"][:3], 100) if len(colors["accent"]) == 3 else colors["accent"]
+            for mist_x, mist_y, mist_size in mists:
                 # Draw semi-transparent mist
                 draw.ellipse([mist_x - mist_size, mist_y - mist_size//2,
                              mist_x + mist_size, mist_y + mist_size//2],
-                            fill=(*colors["accent"][:3], 100) if len(colors["accent"]) == 3 else colors["accent"])
+                            fill=mist_color)
         
         elif theme == "fantasy":
             # Add magical sparkles
-            for i in range(20):
-                spark_x = random.randint(0, width)
-                spark_y = random.randint(0, height)
-                spark_size = random.randint(2, 8)
-                
+            sparkles = self._rng.integers((0, 0, 2), (width + 1, height + 1, 9), size=(20, 3)).tolist()
+            for spark_x, spark_y, spark_size in sparkles:
                 draw.ellipse([spark_x - spark_size, spark_y - spark_size,
                              spark_x + spark_size, spark_y + spark_size],
                             fill=colors["accent"])
         
         elif theme == "adventure":
             # Add clouds
-            for i in range(3):
-                cloud_x = random.randint(width // 4, 3 * width // 4)
-                cloud_y = random.randint(height // 8, height // 3)
-                cloud_size = random.randint(40, 80)
-                
+            clouds = self._rng.integers(
+                (width // 4, height // 8, 40), (3 * width // 4 + 1, height // 3 + 1, 81), size=(3, 3)
+            ).tolist()
+            for cloud_x, cloud_y, cloud_size in clouds:
                 draw.ellipse([cloud_x - cloud_size, cloud_y - cloud_size//2,
                              cloud_x + cloud_size, cloud_y + cloud_size//2],
                             fill=(255, 255, 255, 150))
@@ -1103,19 +1454,23 @@ Return only the enhanced visual prompt, nothing else."""
     def _apply_story_mood_filter(self, image: Image.Image, theme: str) -> Image.Image:
         """Apply mood-based filters to story image."""
         if theme == "mystery":
-            image = image.filter(ImageFilter.GaussianBlur(radius=0.5))
+            image = image.filter(_SOFT_BLUR)
         elif theme == "adventure":
             image = image.filter(ImageFilter.SHARPEN)
         elif theme == "romance":
             # Soft focus effect
-            image = image.filter(ImageFilter.GaussianBlur(radius=0.3))
+            image = image.filter(_FAINT_BLUR)
         elif theme == "fantasy":
             image = image.filter(ImageFilter.EDGE_ENHANCE_MORE)
         
         return image
     
     def _generate_fallback_story_image(self) -> str:
-        """Generate a simple fallback story image."""
+        """Return the simple fallback story image."""
+        return self._fallback_story_data_url
+    
+    def _build_fallback_story_image(self) -> str:
+        """Render the simple fallback story image."""
         size = (1024, 768)
         image = Image.new('RGBA', size, (135, 206, 235, 255))  # Sky blue background
         draw = ImageDraw.Draw(image)
@@ -1128,107 +1483,89 @@ Return only the enhanced visual prompt, nothing else."""
         sun_size = 40
         draw.ellipse([size[0] - 100, 50, size[0] - 20, 130], fill=(255, 215, 0))
         
-        # Convert to base64
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return f"data:image/png;base64,{img_str}"
+        return _image_data_url(image)
     
     async def _generate_procedural_image(self, element_type: str, emotion: str) -> str:
         """Generate procedural image when AI generation is not available."""
+        static_key = (element_type, emotion)
+        if element_type in _STATIC_ELEMENT_TYPES:
+            cached = self._static_element_images.get(static_key)
+            if cached is not None:
+                self._static_element_images.move_to_end(static_key)
+                return cached
+        
         try:
-            # Create image canvas
-            size = (512, 512)
-            image = Image.new('RGBA', size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(image)
-            
-            # Get emotion-based colors
-            color_palette = self._get_emotion_colors(emotion)
-            
-            # Draw element based on type
-            if element_type in ["flower", "plant"]:
-                self._draw_flower(draw, size, color_palette)
-            elif element_type == "tree":
-                self._draw_tree(draw, size, color_palette)
-            elif element_type == "crystal":
-                self._draw_crystal(draw, size, color_palette)
-            elif element_type in ["butterfly", "bird"]:
-                self._draw_creature(draw, size, color_palette, element_type)
-            elif element_type in ["stone", "rock"]:
-                self._draw_stone(draw, size, color_palette)
-            elif element_type == "water":
-                self._draw_water(draw, size, color_palette)
-            else:
-                self._draw_abstract(draw, size, color_palette)
-            
-            # Apply filters for mood
-            image = self._apply_mood_filter(image, emotion)
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
+            # Drawing and encoding are CPU-bound, so keep them off the event loop
+            data_url = await asyncio.to_thread(self._render_procedural_image, element_type, emotion)
+            if element_type in _STATIC_ELEMENT_TYPES:
+                self._static_element_images[static_key] = data_url
+                while len(self._static_element_images) > _MAX_STATIC_ELEMENT_IMAGES:
+                    self._static_element_images.popitem(last=False)
+            return data_url
             
         except Exception as e:
             logger.error(f"Error generating procedural image: {e}")
             return self._generate_fallback_image()
     
-    def _get_emotion_colors(self, emotion: str) -> Dict[str, tuple]:
-        """Get color palette based on emotion."""
-        palettes = {
-            "joy": {
-                "primary": (255, 215, 0),    # Gold
-                "secondary": (255, 165, 0),  # Orange
-                "accent": (255, 255, 224)    # Light yellow
-            },
-            "love": {
-                "primary": (255, 182, 193),  # Light pink
-                "secondary": (255, 105, 180), # Hot pink
-                "accent": (255, 228, 225)    # Misty rose
-            },
-            "calm": {
-                "primary": (173, 216, 230),  # Light blue
-                "secondary": (176, 196, 222), # Light steel blue
-                "accent": (240, 248, 255)    # Alice blue
-            },
-            "sadness": {
-                "primary": (70, 130, 180),   # Steel blue
-                "secondary": (100, 149, 237), # Cornflower blue
-                "accent": (176, 196, 222)    # Light steel blue
-            },
-            "anxiety": {
-                "primary": (128, 128, 128),  # Gray
-                "secondary": (105, 105, 105), # Dim gray
-                "accent": (211, 211, 211)    # Light gray
-            }
-        }
+    def _render_procedural_image(self, element_type: str, emotion: str) -> str:
+        """Draw and encode a procedural sanctuary element image."""
+        # Create image canvas
+        size = (512, 512)
+        image = Image.new('RGBA', size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
         
-        return palettes.get(emotion, {
-            "primary": (144, 238, 144),   # Light green
-            "secondary": (152, 251, 152), # Pale green
-            "accent": (240, 255, 240)     # Honeydew
-        })
+        # Get emotion-based colors
+        color_palette = self._get_emotion_colors(emotion)
+        
+        # Draw element based on type
+        if element_type in ["flower", "plant"]:
+            self._draw_flower(draw, size, color_palette)
+        elif element_type == "tree":
+            self._draw_tree(draw, size, color_palette)
+        elif element_type == "crystal":
+            self._draw_crystal(draw, size, color_palette)
+        elif element_type in ["butterfly", "bird"]:
+            self._draw_creature(draw, size, color_palette, element_type)
+        elif element_type in ["stone", "rock"]:
+            self._draw_stone(draw, size, color_palette)
+        elif element_type == "water":
+            self._draw_water(draw, size, color_palette)
+        else:
+            self._draw_abstract(draw, size, color_palette)
+        
+        # Apply filters for mood. Elements only cover the middle of the transparent
+        # canvas, so filter just the occupied region plus a margin wider than the
+        # filter kernels; the untouched border is fully transparent either way.
+        bbox = image.getbbox()
+        if bbox:
+            left, top, right, bottom = bbox
+            region = (
+                max(0, left - _MOOD_FILTER_MARGIN), max(0, top - _MOOD_FILTER_MARGIN),
+                min(size[0], right + _MOOD_FILTER_MARGIN), min(size[1], bottom + _MOOD_FILTER_MARGIN)
+            )
+            image.paste(self._apply_mood_filter(image.crop(region), emotion), region[:2])
+        
+        return _image_data_url(image)
+    
+    def _get_emotion_colors(self, emotion: str) -> Mapping[str, tuple]:
+        """Get color palette based on emotion."""
+        return _EMOTION_PALETTES.get(emotion, _DEFAULT_EMOTION_PALETTE)
     
     def _draw_flower(self, draw, size, colors):
         """Draw a procedural flower."""
         center_x, center_y = size[0] // 2, size[1] // 2
         
         # Draw petals
-        petal_count = random.randint(5, 8)
-        petal_size = random.randint(40, 80)
+        petal_count, petal_size = self._rng.integers((5, 40), (9, 81)).tolist()
         
-        for i in range(petal_count):
-            angle = (2 * math.pi * i) / petal_count
-            petal_x = center_x + math.cos(angle) * 30
-            petal_y = center_y + math.sin(angle) * 30
-            
-            draw.ellipse([
-                petal_x - petal_size//2, petal_y - petal_size//2,
-                petal_x + petal_size//2, petal_y + petal_size//2
-            ], fill=colors["primary"], outline=colors["secondary"], width=2)
+        petal_centers = _regular_polygon_points(center_x, center_y, petal_count, 30)
+        petal_radius = petal_size // 2
+        ellipse, petal_fill, petal_outline = draw.ellipse, colors["primary"], colors["secondary"]
+        for petal_x, petal_y in zip(petal_centers[0::2], petal_centers[1::2]):
+            ellipse([
+                petal_x - petal_radius, petal_y - petal_radius,
+                petal_x + petal_radius, petal_y + petal_radius
+            ], fill=petal_fill, outline=petal_outline, width=2)
         
         # Draw center
         draw.ellipse([
@@ -1250,7 +1587,7 @@ Return only the enhanced visual prompt, nothing else."""
         ], fill=colors["secondary"])
         
         # Draw crown
-        crown_radius = random.randint(60, 100)
+        crown_radius = int(self._rng.integers(60, 101))
         crown_center_y = bottom - trunk_height - crown_radius//2
         
         draw.ellipse([
@@ -1263,26 +1600,14 @@ Return only the enhanced visual prompt, nothing else."""
         center_x, center_y = size[0] // 2, size[1] // 2
         
         # Draw crystal facets
-        points = []
         sides = 6
-        radius = random.randint(60, 100)
-        
-        for i in range(sides):
-            angle = (2 * math.pi * i) / sides
-            x = center_x + math.cos(angle) * radius
-            y = center_y + math.sin(angle) * radius
-            points.extend([x, y])
+        radius = int(self._rng.integers(60, 101))
         
+        points = _regular_polygon_points(center_x, center_y, sides, radius)
         draw.polygon(points, fill=colors["primary"], outline=colors["secondary"], width=3)
         
         # Add inner reflection
-        inner_points = []
-        for i in range(sides):
-            angle = (2 * math.pi * i) / sides
-            x = center_x + math.cos(angle) * radius * 0.5
-            y = center_y + math.sin(angle) * radius * 0.5
-            inner_points.extend([x, y])
-        
+        inner_points = _regular_polygon_points(center_x, center_y, sides, radius * 0.5)
         draw.polygon(inner_points, fill=colors["accent"])
     
     def _draw_creature(self, draw, size, colors, creature_type):
@@ -1332,37 +1657,29 @@ Return only the enhanced visual prompt, nothing else."""
         center_x, center_y = size[0] // 2, size[1] // 2
         
         # Create irregular stone shape
-        points = []
-        vertices = random.randint(6, 10)
-        base_radius = random.randint(50, 80)
-        
-        for i in range(vertices):
-            angle = (2 * math.pi * i) / vertices
-            radius_variation = random.uniform(0.7, 1.3)
-            radius = base_radius * radius_variation
-            x = center_x + math.cos(angle) * radius
-            y = center_y + math.sin(angle) * radius
-            points.extend([x, y])
+        vertices, base_radius = self._rng.integers((6, 50), (11, 81)).tolist()
         
+        radii = (base_radius * self._rng.uniform(0.7, 1.3, size=vertices)).tolist()
+        points = _regular_polygon_points(center_x, center_y, vertices, radii)
         draw.polygon(points, fill=colors["primary"], outline=colors["secondary"], width=2)
         
         # Add texture lines
-        for _ in range(3):
-            start_x = random.randint(center_x - 30, center_x + 30)
-            start_y = random.randint(center_y - 30, center_y + 30)
-            end_x = start_x + random.randint(-20, 20)
-            end_y = start_y + random.randint(-20, 20)
+        lines = self._rng.integers(
+            (center_x - 30, center_y - 30, -20, -20), (center_x + 31, center_y + 31, 21, 21), size=(3, 4)
+        ).tolist()
+        for start_x, start_y, delta_x, delta_y in lines:
+            end_x = start_x + delta_x
+            end_y = start_y + delta_y
             draw.line([start_x, start_y, end_x, end_y], fill=colors["accent"], width=2)
     
     def _draw_water(self, draw, size, colors):
         """Draw procedural water."""
         # Draw flowing water with curves
+        xs = np.arange(0, size[0], 20)
         for i in range(5):
             y = size[1] // 2 + (i - 2) * 15
-            points = []
-            for x in range(0, size[0], 20):
-                wave_y = y + math.sin(x * 0.02 + i) * 10
-                points.extend([x, wave_y])
+            wave_ys = y + np.sin(xs * 0.02 + i) * 10
+            points = np.column_stack([xs, wave_ys]).ravel().tolist()
             
             if len(points) >= 4:
                 draw.line(points, fill=colors["primary"], width=8)
@@ -1373,33 +1690,35 @@ Return only the enhanced visual prompt, nothing else."""
         center_x, center_y = size[0] // 2, size[1] // 2
         
         # Draw flowing abstract shapes
-        for i in range(3):
-            offset_x = random.randint(-50, 50)
-            offset_y = random.randint(-50, 50)
-            radius = random.randint(30, 60)
-            
+        shapes = self._rng.integers((-50, -50, 30), (51, 51, 61), size=(3, 3)).tolist()
+        shape_color = (*colors["primary"][:3], 128)  # Semi-transparent
+        for offset_x, offset_y, radius in shapes:
             draw.ellipse([
                 center_x + offset_x - radius, center_y + offset_y - radius,
                 center_x + offset_x + radius, center_y + offset_y + radius
-            ], fill=(*colors["primary"][:3], 128))  # Semi-transparent
+            ], fill=shape_color)
     
     def _apply_mood_filter(self, image: Image.Image, emotion: str) -> Image.Image:
         """Apply mood-based filters to image."""
         if emotion in ["calm", "peace"]:
-            image = image.filter(ImageFilter.GaussianBlur(radius=0.5))
+            image = image.filter(_SOFT_BLUR)
         elif emotion in ["anxiety", "worry"]:
             image = image.filter(ImageFilter.EDGE_ENHANCE_MORE)
         elif emotion in ["joy", "excitement"]:
-            # Increase saturation effect (simplified)
-            pass
+            # Increase saturation effect
+            image = _adjust_saturation(image, _JOY_SATURATION)
         elif emotion in ["sadness", "melancholy"]:
-            # Desaturate effect (simplified)
-            pass
+            # Desaturate effect
+            image = _adjust_saturation(image, _SADNESS_SATURATION)
         
         return image
     
     def _generate_fallback_image(self) -> str:
-        """Generate a simple fallback image."""
+        """Return the simple fallback image."""
+        return self._fallback_data_url
+    
+    def _build_fallback_image(self) -> str:
+        """Render the simple fallback image."""
         size = (512, 512)
         image = Image.new('RGBA', size, (200, 200, 200, 255))
         draw = ImageDraw.Draw(image)
@@ -1412,12 +1731,7 @@ Return only the enhanced visual prompt, nothing else."""
             center + radius, center + radius
         ], fill=(150, 150, 150), outline=(100, 100, 100), width=3)
         
-        # Convert to base64
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return f"data:image/png;base64,{img_str}"
+        return _image_data_url(image)
 
 # Global service instance
 image_generation_service = ImageGenerationService()
\ No newline at end of file
@@ -1,151 +1,232 @@
-from textblob import TextBlob
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from functools import lru_cache
+from collections import Counter
+import asyncio
+import copy
+from app.config import settings
+from app.utils.keyword_index import KeywordIndex
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Text normalization patterns, compiled once
+_WHITESPACE_RE = re.compile(r'\s+')
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s.,!?-]')
+# Same filter for pure-ASCII text as a str.translate deletion table, derived from the pattern
+_ASCII_DISALLOWED_TABLE = {code: None for code in range(128) if _DISALLOWED_CHARS_RE.match(chr(code))}
+
+# Therapeutic themes and the whole words/phrases that signal them
+_THEME_KEYWORDS = {
+    "growth": ("grow", "growth", "develop", "progress", "improve", "better", "learning", "evolve"),
+    "resilience": ("overcome", "strong", "survive", "endure", "bounce back", "recover", "resilient"),
+    "gratitude": ("thank", "grateful", "appreciate", "blessed", "lucky", "fortunate"),
+    "self_care": ("care", "rest", "relax", "treat myself", "self-love", "nurture", "wellness"),
+    "relationships": ("friend", "family", "love", "connection", "together", "support", "bond"),
+    "mindfulness": ("present", "aware", "mindful", "focus", "breathe", "meditate", "conscious"),
+    "goals": ("achieve", "goal", "dream", "aspire", "ambition", "future", "success"),
+    "healing": ("heal", "recover", "mend", "restore", "peace", "wholeness", "therapy"),
+    "creativity": ("create", "art", "music", "write", "express", "imagine", "inspire"),
+    "spirituality": ("spirit", "soul", "meaning", "purpose", "faith", "divine", "sacred")
+}
+
+# Keyword -> themes it signals ("recover" belongs to two)
+_THEMES_BY_KEYWORD = {
+    keyword: tuple(theme for theme, theme_keywords in _THEME_KEYWORDS.items() if keyword in theme_keywords)
+    for keywords in _THEME_KEYWORDS.values()
+    for keyword in keywords
+}
+
+# One pass over the text for all themes. The lookahead reports a keyword at every
+# position, so "love" is still found inside "self-love"; longest keywords go first.
+_THEME_RE = re.compile(
+    r'(?=\b(' + '|'.join(map(re.escape, sorted(_THEMES_BY_KEYWORD, key=len, reverse=True))) + r')\b)'
+)
+
+# Emotions and the keywords that signal them, matched as substrings of each word
+_EMOTION_KEYWORDS = {
+    "joy": ["happy", "excited", "delighted", "thrilled", "ecstatic", "cheerful", "elated"],
+    "love": ["love", "adore", "cherish", "affection", "caring", "devoted", "tender"],
+    "gratitude": ["grateful", "thankful", "blessed", "appreciative", "fortunate"],
+    "hope": ["hopeful", "optimistic", "confident", "positive", "bright", "promising"],
+    "calm": ["peaceful", "serene", "tranquil", "relaxed", "calm", "content", "soothed"],
+    "sadness": ["sad", "down", "blue", "melancholy", "gloomy", "dejected", "sorrowful"],
+    "anger": ["angry", "furious", "mad", "irritated", "annoyed", "frustrated", "livid"],
+    "fear": ["scared", "afraid", "terrified", "anxious", "worried", "nervous", "fearful"],
+    "anxiety": ["anxious", "stressed", "overwhelmed", "panicked", "tense", "uneasy"],
+    "loneliness": ["lonely", "isolated", "alone", "abandoned", "disconnected", "empty"],
+    "confusion": ["confused", "uncertain", "lost", "bewildered", "puzzled", "unclear"],
+    "disappointment": ["disappointed", "let down", "discouraged", "deflated", "disheartened"]
+}
+# Answers "which emotions have a keyword in this word?" in one scan per word
+_EMOTION_INDEX = KeywordIndex(_EMOTION_KEYWORDS)
+
+# Journal vocabulary repeats heavily, so most words resolve from this cache
+@lru_cache(maxsize=8192)
+def _emotions_in_word(word: str) -> Tuple[str, ...]:
+    """Emotions with a keyword contained in word."""
+    return tuple(_EMOTION_INDEX.find(word))
+
+# Optional lexicon-based scorer; much faster than TextBlob's pattern analyzer.
+# Used for everything, or only for short entries when SENTIMENT_SHORT_TEXT_WORDS is set
+_VADER = None
+# Entries with fewer words than this are scored by VADER; None means all of them
+_VADER_MAX_WORDS = None if settings.SENTIMENT_ANALYZER == "vader" else settings.SENTIMENT_SHORT_TEXT_WORDS
+if _VADER_MAX_WORDS is None or _VADER_MAX_WORDS > 0:
+    try:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _VADER = SentimentIntensityAnalyzer()
+    except ImportError:
+        logger.warning("vaderSentiment package not installed, falling back to TextBlob")
+
+# TextBlob tagging dominates analysis cost and entries are often re-analyzed
+@lru_cache(maxsize=1024)
+def _analyze_cleaned_text(cleaned_text: str) -> Dict[str, Any]:
+    """Run the full analysis on already cleaned text."""
+    # Tokenize once for everything that works on words
+    words = cleaned_text.split()
+    
+    if _VADER is not None and (_VADER_MAX_WORDS is None or len(words) < _VADER_MAX_WORDS):
+        scores = _VADER.polarity_scores(cleaned_text)
+        sentiment_score = scores["compound"]  # -1 to 1
+        subjectivity = scores["pos"] + scores["neg"]  # Share of opinionated tokens, 0 to 1
+    else:
+        # Use TextBlob for sentiment analysis. Imported on first use: it pulls in
+        # NLTK and the pattern analyzer, which slows app startup noticeably
+        from textblob import TextBlob
+        blob = TextBlob(cleaned_text)
+        sentiment_score = blob.sentiment.polarity  # -1 to 1
+        subjectivity = blob.sentiment.subjectivity  # 0 to 1
+    
+    # Detect specific emotions
+    detected_emotions, strongest_emotion = _detect_emotions(words)
+    primary_emotion = _get_primary_emotion(strongest_emotion, sentiment_score)
+    
+    # Calculate intensity
+    intensity = _calculate_intensity(sentiment_score, subjectivity, detected_emotions)
+    
+    # Extract themes
+    themes = _extract_themes(cleaned_text)
+    
+    return {
+        "sentiment_score": round(sentiment_score, 3),
+        "subjectivity": round(subjectivity, 3),
+        "primary_emotion": primary_emotion,
+        "detected_emotions": detected_emotions,
+        "intensity": intensity,
+        "themes": themes,
+        "word_count": len(words),
+        "confidence": _calculate_confidence(sentiment_score, subjectivity, detected_emotions)
+    }
+
+def _detect_emotions(words: List[str]) -> Tuple[Dict[str, float], Optional[str]]:
+    """Detect emotions based on keyword matching over the text's words.
+    
+    Returns the emotion scores and the highest scoring emotion (None when
+    nothing matched); ties go to the emotion listed first.
+    """
+    emotions = {}
+    total_words = len(words)
+    
+    if total_words == 0:
+        return emotions, None
+    
+    # Count repeated words in C first, then look up each distinct word once
+    counts = dict.fromkeys(_EMOTION_KEYWORDS, 0)
+    for word, occurrences in Counter(words).items():
+        for emotion in _emotions_in_word(word):
+            counts[emotion] += occurrences
+    
+    strongest_emotion = None
+    best_score = 0.0
+    for emotion, count in counts.items():
+        if count > 0:
+            score = round(count / total_words, 3)
+            emotions[emotion] = score
+            if strongest_emotion is None or score > best_score:
+                strongest_emotion, best_score = emotion, score
+    
+    return emotions, strongest_emotion
+
+def _get_primary_emotion(strongest_emotion: Optional[str], sentiment_score: float) -> str:
+    """Determine primary emotion from the strongest detected emotion and sentiment."""
+    if strongest_emotion is not None:
+        # Highest scoring emotion, tracked during detection
+        return strongest_emotion
+    
+    # Fallback to sentiment-based emotion
+    if sentiment_score > 0.6:
+        return "joy"
+    elif sentiment_score > 0.2:
+        return "calm"
+    elif sentiment_score > -0.2:
+        return "neutral"
+    elif sentiment_score > -0.6:
+        return "sadness"
+    else:
+        return "anxiety"
+
+def _calculate_intensity(sentiment_score: float, subjectivity: float, detected_emotions: Dict[str, float]) -> float:
+    """Calculate emotional intensity."""
+    # Sentiment strength, boosted by subjectivity and detected emotions (sum of none is 0)
+    intensity = abs(sentiment_score) + subjectivity * 0.3 + sum(detected_emotions.values()) * 0.2
+    return min(round(intensity, 3), 1.0)
+
+def _extract_themes(text: str) -> List[str]:
+    """Extract therapeutic themes from text."""
+    found = set()
+    for match in _THEME_RE.finditer(text):
+        found.update(_THEMES_BY_KEYWORD[match.group(1)])
+    
+    themes = [theme for theme in _THEME_KEYWORDS if theme in found]
+    return themes if themes else ["reflection"]
+
+def _calculate_confidence(sentiment_score: float, subjectivity: float, detected_emotions: Dict[str, float]) -> float:
+    """Calculate confidence in the analysis."""
+    # Higher confidence for stronger sentiments and detected emotions; very
+    # objective or very subjective text can be less reliable
+    confidence = (
+        0.5
+        + abs(sentiment_score) * 0.3
+        + min(sum(detected_emotions.values()), 0.3)
+        - abs(subjectivity - 0.5) * 0.1
+    )
+    return min(max(round(confidence, 3), 0.1), 1.0)
+
 class SentimentService:
     def __init__(self):
-        self.emotion_keywords = {
-            "joy": ["happy", "excited", "delighted", "thrilled", "ecstatic", "cheerful", "elated"],
-            "love": ["love", "adore", "cherish", "affection", "caring", "devoted", "tender"],
-            "gratitude": ["grateful", "thankful", "blessed", "appreciative", "fortunate"],
-            "hope": ["hopeful", "optimistic", "confident", "positive", "bright", "promising"],
-            "calm": ["peaceful", "serene", "tranquil", "relaxed", "calm", "content", "soothed"],
-            "sadness": ["sad", "down", "blue", "melancholy", "gloomy", "dejected", "sorrowful"],
-            "anger": ["angry", "furious", "mad", "irritated", "annoyed", "frustrated", "livid"],
-            "fear": ["scared", "afraid", "terrified", "anxious", "worried", "nervous", "fearful"],
-            "anxiety": ["anxious", "stressed", "overwhelmed", "panicked", "tense", "uneasy"],
-            "loneliness": ["lonely", "isolated", "alone", "abandoned", "disconnected", "empty"],
-            "confusion": ["confused", "uncertain", "lost", "bewildered", "puzzled", "unclear"],
-            "disappointment": ["disappointed", "let down", "discouraged", "deflated", "disheartened"]
-        }
+        self.emotion_keywords = _EMOTION_KEYWORDS
     
     def analyze_sentiment(self, text: str) -> Dict[str, Any]:
-        """Analyze sentiment and emotion from text."""
+        """Analyze sentiment and emotion from text, falling back to a neutral result on failure."""
         try:
-            # Clean and prepare text
-            cleaned_text = self._clean_text(text)
-            
-            # Use TextBlob for sentiment analysis
-            blob = TextBlob(cleaned_text)
-            sentiment_score = blob.sentiment.polarity  # -1 to 1
-            subjectivity = blob.sentiment.subjectivity  # 0 to 1
-            
-            # Detect specific emotions
-            detected_emotions = self._detect_emotions(cleaned_text)
-            primary_emotion = self._get_primary_emotion(detected_emotions, sentiment_score)
-            
-            # Calculate intensity
-            intensity = self._calculate_intensity(sentiment_score, subjectivity, detected_emotions)
-            
-            # Extract themes
-            themes = self._extract_themes(cleaned_text)
-            
-            return {
-                "sentiment_score": round(sentiment_score, 3),
-                "subjectivity": round(subjectivity, 3),
-                "primary_emotion": primary_emotion,
-                "detected_emotions": detected_emotions,
-                "intensity": intensity,
-                "themes": themes,
-                "word_count": len(cleaned_text.split()),
-                "confidence": self._calculate_confidence(sentiment_score, subjectivity, detected_emotions)
-            }
-        
+            return self._analyze_sentiment_impl(text)
         except Exception as e:
-            logger.error(f"Error analyzing sentiment: {e}")
+            logger.warning(f"Error analyzing sentiment, using fallback analysis: {e}")
             return self._fallback_analysis(text)
     
+    def _analyze_sentiment_impl(self, text: str) -> Dict[str, Any]:
+        """Analyze sentiment and emotion from text; errors propagate to the caller."""
+        # Clean and prepare text
+        cleaned_text = self._clean_text(text)
+        
+        # Results are cached per cleaned text; hand out a copy so callers
+        # can't mutate the cached entry
+        return copy.deepcopy(_analyze_cleaned_text(cleaned_text))
+    
+    async def analyze_sentiment_async(self, text: str) -> Dict[str, Any]:
+        """Analyze sentiment in a worker thread so TextBlob doesn't block the event loop."""
+        return await asyncio.to_thread(self.analyze_sentiment, text)
+    
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text for analysis."""
         # Remove extra whitespace and special characters
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s.,!?-]', '', text)
-        return text.strip().lower()
-    
-    def _detect_emotions(self, text: str) -> Dict[str, float]:
-        """Detect emotions based on keyword matching."""
-        emotions = {}
-        words = text.split()
-        total_words = len(words)
-        
-        if total_words == 0:
-            return emotions
-        
-        for emotion, keywords in self.emotion_keywords.items():
-            count = sum(1 for word in words if any(keyword in word for keyword in keywords))
-            if count > 0:
-                emotions[emotion] = round(count / total_words, 3)
-        
-        return emotions
-    
-    def _get_primary_emotion(self, detected_emotions: Dict[str, float], sentiment_score: float) -> str:
-        """Determine primary emotion from detected emotions and sentiment."""
-        if detected_emotions:
-            # Return emotion with highest score
-            return max(detected_emotions, key=detected_emotions.get)
-        
-        # Fallback to sentiment-based emotion
-        if sentiment_score > 0.6:
-            return "joy"
-        elif sentiment_score > 0.2:
-            return "calm"
-        elif sentiment_score > -0.2:
-            return "neutral"
-        elif sentiment_score > -0.6:
-            return "sadness"
+        text = _WHITESPACE_RE.sub(' ', text)
+        if text.isascii():
+            text = text.translate(_ASCII_DISALLOWED_TABLE)
         else:
-            return "anxiety"
-    
-    def _calculate_intensity(self, sentiment_score: float, subjectivity: float, detected_emotions: Dict[str, float]) -> float:
-        """Calculate emotional intensity."""
-        base_intensity = abs(sentiment_score)
-        subjectivity_boost = subjectivity * 0.3
-        emotion_boost = sum(detected_emotions.values()) * 0.2 if detected_emotions else 0
-        
-        intensity = base_intensity + subjectivity_boost + emotion_boost
-        return min(round(intensity, 3), 1.0)
-    
-    def _extract_themes(self, text: str) -> List[str]:
-        """Extract therapeutic themes from text."""
-        themes = []
-        
-        theme_patterns = {
-            "growth": r'\b(grow|growth|develop|progress|improve|better|learning|evolve)\b',
-            "resilience": r'\b(overcome|strong|survive|endure|bounce back|recover|resilient)\b',
-            "gratitude": r'\b(thank|grateful|appreciate|blessed|lucky|fortunate)\b',
-            "self_care": r'\b(care|rest|relax|treat myself|self-love|nurture|wellness)\b',
-            "relationships": r'\b(friend|family|love|connection|together|support|bond)\b',
-            "mindfulness": r'\b(present|aware|mindful|focus|breathe|meditate|conscious)\b',
-            "goals": r'\b(achieve|goal|dream|aspire|ambition|future|success)\b',
-            "healing": r'\b(heal|recover|mend|restore|peace|wholeness|therapy)\b',
-            "creativity": r'\b(create|art|music|write|express|imagine|inspire)\b',
-            "spirituality": r'\b(spirit|soul|meaning|purpose|faith|divine|sacred)\b'
-        }
-        
-        for theme, pattern in theme_patterns.items():
-            if re.search(pattern, text):
-                themes.append(theme)
-        
-        return themes if themes else ["reflection"]
-    
-    def _calculate_confidence(self, sentiment_score: float, subjectivity: float, detected_emotions: Dict[str, float]) -> float:
-        """Calculate confidence in the analysis."""
-        base_confidence = 0.5
-        
-        # Higher confidence for stronger sentiments
-        sentiment_confidence = abs(sentiment_score) * 0.3
-        
-        # Higher confidence for detected emotions
-        emotion_confidence = min(sum(detected_emotions.values()), 0.3) if detected_emotions else 0
-        
-        # Adjust for subjectivity (very objective or very subjective can be less reliable)
-        subjectivity_penalty = abs(subjectivity - 0.5) * 0.1
-        
-        confidence = base_confidence + sentiment_confidence + emotion_confidence - subjectivity_penalty
-        return min(max(round(confidence, 3), 0.1), 1.0)
+            text = _DISALLOWED_CHARS_RE.sub('', text)
+        return text.strip().lower()
     
     def _fallback_analysis(self, text: str) -> Dict[str, Any]:
         """Fallback analysis when main analysis fails."""
@@ -3,29 +3,134 @@ from groq import Groq
 import asyncio
 import logging
 from typing import Dict, Any, Optional, List
+from collections import Counter
+from functools import cached_property
 from app.config import settings
+from app.utils.cache import ResponseCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 import random
 import re
 
 logger = logging.getLogger(__name__)
 
+# Style-specific instructions
+_STYLE_INSTRUCTIONS = {
+    "allegory": """Create an allegorical story with symbolic characters and situations that mirror the user's emotional journey. Use metaphors and symbols throughout. The story should have a clear moral or insight that relates to therapeutic growth.""",
+    
+    "fairy_tale": """Write in the style of a healing fairy tale with magical elements, gentle wisdom, and a hopeful ending. Include elements like wise animals, magical forests, or benevolent spirits. Focus on transformation and wonder.""",
+    
+    "meditation": """Create a meditative, contemplative narrative that guides the reader through a peaceful inner journey. Use sensory details, breathing imagery, and calming natural settings. The pace should be slow and reflective.""",
+    
+    "adventure": """Write an uplifting adventure story where the protagonist faces challenges and discovers inner strength. Include elements of courage, discovery, and personal growth. The journey should mirror therapeutic progress.""",
+    
+    "wisdom": """Tell a wisdom story in the tradition of ancient parables or teachings. Include a wise character who shares insights about life, healing, and growth. Focus on timeless truths and gentle guidance."""
+}
+
+# Static start of every story prompt, per style. The per-session context goes after it,
+# so repeated requests share a byte-identical prefix that providers can cache
+_STORY_PROMPT_PREFIXES = {
+    style: f"""You are a master storyteller creating therapeutic stories for a healing app called HavenMind.
+
+{instructions}
+
+Story Requirements:
+1. Length: 400-800 words
+2. Include a clear title
+3. Incorporate elements from the user's sanctuary naturally
+4. Address the story theme given in the user context
+5. End with hope, growth, or wisdom
+6. Use inclusive, gentle language
+7. Avoid dark or triggering content
+8. Include sensory details and emotional resonance
+
+Please write a complete story that will provide comfort, insight, and inspiration to someone on a healing journey, based on the user context below."""
+    for style, instructions in _STYLE_INSTRUCTIONS.items()
+}
+
+_STYLE_TITLES = {
+    "allegory": (
+        "The Garden of Understanding",
+        "The Bridge of Becoming", 
+        "The Mirror of Truth",
+        "The Lighthouse Within"
+    ),
+    "fairy_tale": (
+        "The Enchanted Sanctuary",
+        "The Wise Tree's Gift",
+        "The Crystal of Healing",
+        "The Magic of Growing"
+    ),
+    "meditation": (
+        "A Journey to Stillness", 
+        "Breathing with the Earth",
+        "The Peaceful Path Within",
+        "Moments of Grace"
+    ),
+    "adventure": (
+        "The Quest for Inner Strength",
+        "Journey to the Hidden Valley",
+        "The Courage to Continue",
+        "Adventure of the Heart"
+    ),
+    "wisdom": (
+        "The Teacher Within",
+        "Lessons from the Ancient Oak",
+        "The Wisdom of Seasons",
+        "Words from the Heart"
+    )
+}
+
+_THEME_TITLES = {
+    "overcoming_challenges": ("Rising from the Storm", "The Mountain's Lesson"),
+    "transformation_and_growth": ("The Butterfly's Promise", "Seeds of Change"),
+    "finding_inner_light": ("The Candle Within", "Light in the Darkness"),
+    "connection_and_belonging": ("The Circle of Hearts", "Finding Home"),
+    "finding_peace_in_uncertainty": ("Dancing with the Unknown", "Peace in the Storm"),
+    "the_healing_journey": ("Steps Toward Wholeness", "The Healing Garden"),
+    "present_moment_awareness": ("The Gift of Now", "Here in This Moment"),
+    "discovering_inner_wisdom": ("The Voice Within", "Ancient Knowing")
+}
+
+# A leading "# Title", "Title: ..." or "**Title**" line in generated stories
+_TITLE_LINE_RE = re.compile(r'^#\s*(.+)$|^Title:\s*(.+)$|^\*\*(.+)\*\*$', re.MULTILINE)
+_EXTRA_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n')
+
 class StoryService:
     def __init__(self):
         self.gemini_api_key = settings.GEMINI_API_KEY
         self.groq_api_key = settings.GROQ_API_KEY
         
-        # Initialize Gemini if key is available
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.gemini_model = None
-            
-        # Initialize Groq client
-        if self.groq_api_key:
-            self.groq_client = Groq(api_key=self.groq_api_key)
-        else:
-            self.groq_client = None
+        # Caps concurrent outbound Gemini/Groq calls across all requests
+        self._api_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_STORY_REQUESTS)
+        
+        # Skip a provider for a while once it keeps failing, so requests go straight to the other one
+        self._gemini_breaker = CircuitBreaker(
+            "Gemini", settings.STORY_BREAKER_FAILURES, settings.STORY_BREAKER_OPEN_SECONDS
+        )
+        self._groq_breaker = CircuitBreaker(
+            "Groq", settings.STORY_BREAKER_FAILURES, settings.STORY_BREAKER_OPEN_SECONDS
+        )
+        
+        # Generated story text keyed by _story_cache_key (style, theme, emotion and theme sets,
+        # element counts), so equivalent contexts share it; only used when STORY_CACHE_TTL is set
+        self._cache = ResponseCache("story")
+    
+    # Provider clients are built on first use rather than at import; constructing the
+    # Groq client sets up its HTTP connection pool and SSL context, which slows startup
+    @cached_property
+    def gemini_model(self):
+        """Gemini model, or None if no key is configured."""
+        if not self.gemini_api_key:
+            return None
+        genai.configure(api_key=self.gemini_api_key)
+        return genai.GenerativeModel('gemini-pro')
+    
+    @cached_property
+    def groq_client(self) -> Optional[Groq]:
+        """Groq client, or None if no key is configured."""
+        if not self.groq_api_key:
+            return None
+        return Groq(api_key=self.groq_api_key)
     
     async def generate_therapeutic_story(
         self,
@@ -42,7 +147,8 @@ class StoryService:
             prompt = self._create_story_prompt(session_context, story_style, theme)
             
             # Generate story content
-            story_content = await self._generate_story_content(prompt)
+            cache_key = self._story_cache_key(session_context, story_style, theme)
+            story_content = await self._generate_story_content(prompt, cache_key)
             
             if not story_content:
                 story_content = self._generate_fallback_story(story_style, theme, session_context)
@@ -97,42 +203,15 @@ class StoryService:
         # Create sanctuary description
         sanctuary_desc = self._create_sanctuary_description(sanctuary_elements)
         
-        # Style-specific instructions
-        style_instructions = {
-            "allegory": """Create an allegorical story with symbolic characters and situations that mirror the user's emotional journey. Use metaphors and symbols throughout. The story should have a clear moral or insight that relates to therapeutic growth.""",
-            
-            "fairy_tale": """Write in the style of a healing fairy tale with magical elements, gentle wisdom, and a hopeful ending. Include elements like wise animals, magical forests, or benevolent spirits. Focus on transformation and wonder.""",
-            
-            "meditation": """Create a meditative, contemplative narrative that guides the reader through a peaceful inner journey. Use sensory details, breathing imagery, and calming natural settings. The pace should be slow and reflective.""",
-            
-            "adventure": """Write an uplifting adventure story where the protagonist faces challenges and discovers inner strength. Include elements of courage, discovery, and personal growth. The journey should mirror therapeutic progress.""",
-            
-            "wisdom": """Tell a wisdom story in the tradition of ancient parables or teachings. Include a wise character who shares insights about life, healing, and growth. Focus on timeless truths and gentle guidance."""
-        }
-        
-        prompt = f"""You are a master storyteller creating therapeutic stories for a healing app called HavenMind. 
-
-User's Sanctuary Context:
-{sanctuary_desc}
+        prompt = f"""{_STORY_PROMPT_PREFIXES.get(story_style, _STORY_PROMPT_PREFIXES["allegory"])}
 
+---
+User Context:
+Sanctuary: {sanctuary_desc}
 Recent emotional themes: {', '.join(recent_emotions[:5])}
 Therapeutic themes identified: {', '.join(user_themes)}
 Story theme to explore: {theme}
-Story style: {story_style}
-
-{style_instructions.get(story_style, style_instructions["allegory"])}
-
-Story Requirements:
-1. Length: 400-800 words
-2. Include a clear title
-3. Incorporate elements from the user's sanctuary naturally
-4. Address the therapeutic theme of "{theme}"
-5. End with hope, growth, or wisdom
-6. Use inclusive, gentle language
-7. Avoid dark or triggering content
-8. Include sensory details and emotional resonance
-
-Please write a complete story that will provide comfort, insight, and inspiration to someone on a healing journey."""
+Story style: {story_style}"""
 
         return prompt
     
@@ -141,16 +220,9 @@ Please write a complete story that will provide comfort, insight, and inspiratio
         if not sanctuary_elements:
             return "A new sanctuary, full of potential and waiting to be filled with meaningful elements."
         
-        element_counts = {}
-        emotions_present = []
-        
-        for element in sanctuary_elements:
-            element_type = element.get("element_type", "unknown")
-            emotion = element.get("emotion", "neutral")
-            
-            element_counts[element_type] = element_counts.get(element_type, 0) + 1
-            if emotion not in emotions_present:
-                emotions_present.append(emotion)
+        element_counts = Counter(element.get("element_type", "unknown") for element in sanctuary_elements)
+        # dict.fromkeys dedupes in first-seen order, which keeps the prompt (and its cache key) stable
+        emotions_present = list(dict.fromkeys(element.get("emotion", "neutral") for element in sanctuary_elements))
         
         description = f"A sanctuary containing {len(sanctuary_elements)} meaningful elements: "
         
@@ -166,54 +238,148 @@ Please write a complete story that will provide comfort, insight, and inspiratio
         
         return description
     
-    async def _generate_story_content(self, prompt: str) -> Optional[str]:
-        """Generate story content using AI services."""
+    def _story_cache_key(self, session_context: Dict[str, Any], story_style: str, theme: str) -> str:
+        """Cache key for a story request that ignores ordering and repeats in the context.
         
-        # Try Gemini first
-        if self.gemini_model:
-            try:
-                response = await asyncio.to_thread(
-                    self.gemini_model.generate_content,
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        max_output_tokens=1000,
-                        temperature=0.8,
-                        top_p=0.9,
-                    )
-                )
-                
-                if response and response.text:
-                    return response.text.strip()
-                    
-            except Exception as e:
-                logger.error(f"Error with Gemini story generation: {e}")
+        Contexts that only differ in the order of emotions, themes or sanctuary
+        elements produce equivalent prompts, so they share one cached story.
+        """
+        sanctuary_elements = session_context.get("sanctuary_elements", [])
+        element_counts = Counter(element.get("element_type", "unknown") for element in sanctuary_elements)
+        
+        return self._cache.make_key(
+            story_style,
+            theme,
+            ",".join(sorted(set(session_context.get("recent_emotions", [])[:5]))),
+            ",".join(sorted(set(session_context.get("identified_themes", [])))),
+            ",".join(f"{element_type}:{count}" for element_type, count in sorted(element_counts.items())),
+            ",".join(sorted({element.get("emotion", "neutral") for element in sanctuary_elements}))
+        )
+    
+    async def _generate_story_content(self, prompt: str, cache_key: str) -> Optional[str]:
+        """Generate story content, serving equivalent requests from cache when enabled."""
+        if settings.STORY_CACHE_TTL <= 0:
+            return await self._request_story_content(prompt)
         
-        # Try Groq as fallback
+        cached_story = await self._cache.get(cache_key)
+        if cached_story:
+            logger.info("Serving story from cache")
+            return cached_story
+        
+        story_content = await self._request_story_content(prompt)
+        if story_content:
+            await self._cache.set(cache_key, story_content, settings.STORY_CACHE_TTL)
+        return story_content
+    
+    async def _request_story_content(self, prompt: str) -> Optional[str]:
+        """Generate story content using AI services.
+
+        Gemini is tried first. Groq is started once Gemini fails or has run for
+        STORY_HEDGE_DELAY seconds, and whichever returns a story first wins.
+        """
+        providers = []
+        if self.gemini_model:
+            providers.append(self._generate_with_gemini)
         if self.groq_client:
-            try:
-                completion = await asyncio.to_thread(
-                    self.groq_client.chat.completions.create,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a master storyteller creating therapeutic stories for emotional healing and growth."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt
-                        }
-                    ],
-                    model="mixtral-8x7b-32768",
-                    max_tokens=1000,
+            providers.append(self._generate_with_groq)
+        
+        tasks = []
+        try:
+            for index, generate in enumerate(providers):
+                tasks.append(asyncio.create_task(generate(prompt)))
+                # Only wait on the hedge delay while there is another provider to start
+                has_fallback = index < len(providers) - 1
+                story = await self._first_story(tasks, settings.STORY_HEDGE_DELAY if has_fallback else None)
+                if story:
+                    return story
+        finally:
+            # Threads already running can't be interrupted; their results are discarded
+            for task in tasks:
+                task.cancel()
+        
+        return None
+    
+    async def _first_story(self, tasks: List[asyncio.Task], timeout: Optional[float]) -> Optional[str]:
+        """Return the first non-empty story from tasks, or None if they all fail or timeout passes."""
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=timeout):
+                story = await next_done
+                if story:
+                    return story
+        except asyncio.TimeoutError:
+            pass
+        return None
+    
+    async def _call_provider(self, func, *args, **kwargs):
+        """Run a blocking provider SDK call in a thread while holding a request slot.
+
+        Cancelling the caller (e.g. a lost hedge) cannot stop the thread, so the slot
+        is only released once the thread itself finishes.
+        """
+        await self._api_semaphore.acquire()
+        thread_call = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        thread_call.add_done_callback(self._release_provider_slot)
+        return await asyncio.shield(thread_call)
+    
+    def _release_provider_slot(self, thread_call: asyncio.Future) -> None:
+        self._api_semaphore.release()
+        # Retrieve the error of a call whose caller was cancelled so it isn't reported as unhandled
+        if not thread_call.cancelled():
+            thread_call.exception()
+    
+    async def _generate_with_gemini(self, prompt: str) -> Optional[str]:
+        """Generate story content with Gemini."""
+        try:
+            response = await self._gemini_breaker.call(
+                self._call_provider,
+                self.gemini_model.generate_content,
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    max_output_tokens=1000,
                     temperature=0.8,
-                    top_p=0.9
+                    top_p=0.9,
                 )
+            )
+            
+            if response and response.text:
+                return response.text.strip()
                 
-                if completion.choices and completion.choices[0].message:
-                    return completion.choices[0].message.content.strip()
-                    
-            except Exception as e:
-                logger.error(f"Error with Groq story generation: {e}")
+        except CircuitOpenError:
+            logger.debug("Gemini circuit open, skipping")
+        except Exception as e:
+            logger.error(f"Error with Gemini story generation: {e}")
+        
+        return None
+    
+    async def _generate_with_groq(self, prompt: str) -> Optional[str]:
+        """Generate story content with Groq."""
+        try:
+            completion = await self._groq_breaker.call(
+                self._call_provider,
+                self.groq_client.chat.completions.create,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a master storyteller creating therapeutic stories for emotional healing and growth."
+                    },
+                    {
+                        "role": "user", 
+                        "content": prompt
+                    }
+                ],
+                model="mixtral-8x7b-32768",
+                max_tokens=1000,
+                temperature=0.8,
+                top_p=0.9
+            )
+            
+            if completion.choices and completion.choices[0].message:
+                return completion.choices[0].message.content.strip()
+                
+        except CircuitOpenError:
+            logger.debug("Groq circuit open, skipping")
+        except Exception as e:
+            logger.error(f"Error with Groq story generation: {e}")
         
         return None
     
@@ -221,12 +387,12 @@ Please write a complete story that will provide comfort, insight, and inspiratio
         """Process and structure the generated story content."""
         
         # Extract title if present
-        title_match = re.search(r'^#\s*(.+)$|^Title:\s*(.+)$|^\*\*(.+)\*\*$', content, re.MULTILINE)
+        title_match = _TITLE_LINE_RE.search(content)
         
         if title_match:
             title = (title_match.group(1) or title_match.group(2) or title_match.group(3)).strip()
-            # Remove title from content
-            content = re.sub(r'^#\s*.+$|^Title:\s*.+$|^\*\*.+\*\*$', '', content, count=1, flags=re.MULTILINE).strip()
+            # Remove title from content; it is the same span a second search would find
+            content = (content[:title_match.start()] + content[title_match.end():]).strip()
         else:
             title = self._generate_title(style, theme)
         
@@ -249,7 +415,7 @@ Please write a complete story that will provide comfort, insight, and inspiratio
     def _clean_story_content(self, content: str) -> str:
         """Clean and format story content."""
         # Remove excessive whitespace
-        content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
+        content = _EXTRA_BLANK_LINES_RE.sub('\n\n', content)
         
         # Ensure proper paragraph spacing
         paragraphs = content.split('\n\n')
@@ -259,57 +425,9 @@ Please write a complete story that will provide comfort, insight, and inspiratio
     
     def _generate_title(self, style: str, theme: str) -> str:
         """Generate a title based on style and theme."""
-        
-        style_titles = {
-            "allegory": [
-                "The Garden of Understanding",
-                "The Bridge of Becoming", 
-                "The Mirror of Truth",
-                "The Lighthouse Within"
-            ],
-            "fairy_tale": [
-                "The Enchanted Sanctuary",
-                "The Wise Tree's Gift",
-                "The Crystal of Healing",
-                "The Magic of Growing"
-            ],
-            "meditation": [
-                "A Journey to Stillness", 
-                "Breathing with the Earth",
-                "The Peaceful Path Within",
-                "Moments of Grace"
-            ],
-            "adventure": [
-                "The Quest for Inner Strength",
-                "Journey to the Hidden Valley",
-                "The Courage to Continue",
-                "Adventure of the Heart"
-            ],
-            "wisdom": [
-                "The Teacher Within",
-                "Lessons from the Ancient Oak",
-                "The Wisdom of Seasons",
-                "Words from the Heart"
-            ]
-        }
-        
-        theme_titles = {
-            "overcoming_challenges": ["Rising from the Storm", "The Mountain's Lesson"],
-            "transformation_and_growth": ["The Butterfly's Promise", "Seeds of Change"],
-            "finding_inner_light": ["The Candle Within", "Light in the Darkness"],
-            "connection_and_belonging": ["The Circle of Hearts", "Finding Home"],
-            "finding_peace_in_uncertainty": ["Dancing with the Unknown", "Peace in the Storm"],
-            "the_healing_journey": ["Steps Toward Wholeness", "The Healing Garden"],
-            "present_moment_awareness": ["The Gift of Now", "Here in This Moment"],
-            "discovering_inner_wisdom": ["The Voice Within", "Ancient Knowing"]
-        }
-        
-        # Try theme-specific title first
-        if theme in theme_titles:
-            return random.choice(theme_titles[theme])
-        
-        # Fall back to style-specific title
-        return random.choice(style_titles.get(style, style_titles["wisdom"]))
+        # Try theme-specific title first, then fall back to style-specific title
+        titles = _THEME_TITLES.get(theme) or _STYLE_TITLES.get(style, _STYLE_TITLES["wisdom"])
+        return random.choice(titles)
     
     def _generate_fallback_story(self, style: str, theme: str, session_context: Dict[str, Any]) -> Dict[str, Any]:
         """Generate a simple fallback story when AI generation fails."""
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_cache_text(text: str) -> str:
+    """Normalize free text so trivially different inputs share a cache key."""
+    return " ".join(text.lower().split())
+
+class ResponseCache:
+    """Cache-aside store for expensive responses.
+
+    Uses Redis when REDIS_URL is configured, otherwise an in-process LRU bounded
+    by entry count and, when max_bytes is given, by the total size of the values.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 128, max_bytes: Optional[int] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._local_bytes = 0
+        self._redis = None
+        self.stats = {"hits": 0, "misses": 0}
+
+        if settings.REDIS_URL:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            except ImportError:
+                logger.warning("redis package not installed, falling back to in-memory cache")
+
+    def make_key(self, *parts: str) -> str:
+        """Build a deterministic, versioned key from the given parts."""
+        digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+        return f"{settings.CACHE_VERSION}-{self.namespace}:{digest}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on miss."""
+        value = await self._lookup(key)
+        self.stats["misses" if value is None else "hits"] += 1
+        return value
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        """Read key from Redis or the local store without touching stats."""
+        if self._redis is not None:
+            try:
+                return await self._redis.get(key)
+            except Exception as e:
+                logger.warning(f"Cache read failed: {e}")
+                return None
+
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._evict(key)
+            return None
+
+        self._local.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        """Store value under key for ttl seconds."""
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, value, ex=ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed: {e}")
+            return
+
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+
+        if key in self._local:
+            self._evict(key)
+        self._local[key] = (value, time.monotonic() + ttl)
+        self._local_bytes += len(value)
+        while len(self._local) > self.max_entries or (
+            self.max_bytes is not None and self._local_bytes > self.max_bytes
+        ):
+            self._evict(next(iter(self._local)))
+
+    def _evict(self, key: str) -> None:
+        """Drop key from the local store and release its size."""
+        value, _ = self._local.pop(key)
+        self._local_bytes -= len(value)
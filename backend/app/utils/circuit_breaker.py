@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+class CircuitBreaker:
+    """Fail fast on an outbound provider that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls are
+    rejected for open_duration seconds. After that a single probe call is let
+    through (half-open); its outcome closes the circuit or opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, open_duration: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.open_duration:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """Await func(*args, **kwargs) unless the circuit is open."""
+        # State checks and updates never await, so they are atomic on the event loop
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight):
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        probing = state == self.HALF_OPEN
+        self._probe_in_flight = probing
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # A cancelled probe says nothing about the provider; let the next call probe
+            if probing:
+                self._probe_in_flight = False
+            raise
+        except Exception:
+            self._record_failure(probing)
+            raise
+
+        if self._failures:
+            logger.info(f"{self.name} circuit closed")
+        self._failures = 0
+        self._probe_in_flight = False
+        return result
+
+    def _record_failure(self, probing: bool) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if probing or self._failures == self.failure_threshold:
+            self._opened_at = time.monotonic()
+            logger.warning(f"{self.name} circuit opened for {self.open_duration:.0f}s after {self._failures} consecutive failures")
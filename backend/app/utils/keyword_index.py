@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class KeywordIndex:
+    """Precomputed index answering "which groups have a keyword in this text?".
+
+    Matching keeps plain substring semantics (``keyword in text``). Keywords
+    that contain a shorter keyword of the same group are dropped at build time
+    since they can never change the result, and scanning stops as soon as the
+    requested number of groups has been found.
+
+    When pyahocorasick is installed, all keywords are compiled into one
+    automaton and the text is scanned in a single pass instead of once per
+    keyword.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self._entries = []
+        for group, keywords in groups.items():
+            kept = []
+            for keyword in sorted(set(keywords), key=len):
+                if not any(shorter in keyword for shorter in kept):
+                    kept.append(keyword)
+            self._entries.append((group, tuple(kept)))
+
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = self._build_automaton()
+
+    def _build_automaton(self):
+        """Compile every keyword into an automaton mapping it to its group positions."""
+        positions: Dict[str, List[int]] = {}
+        # An empty keyword matches any text, so its groups always match
+        self._always = []
+        for position, (_, keywords) in enumerate(self._entries):
+            for keyword in keywords:
+                if keyword:
+                    positions.setdefault(keyword, []).append(position)
+                else:
+                    self._always.append(position)
+
+        if not positions:
+            return None
+
+        automaton = ahocorasick.Automaton()
+        for keyword, group_positions in positions.items():
+            automaton.add_word(keyword, tuple(group_positions))
+        automaton.make_automaton()
+        return automaton
+
+    def find(self, text: str, limit: Optional[int] = None) -> List[str]:
+        """Return matching groups in their original order, at most limit of them."""
+        if self._automaton is not None:
+            matched = set(self._always)
+            for _, group_positions in self._automaton.iter(text):
+                matched.update(group_positions)
+            found = [self._entries[position][0] for position in sorted(matched)]
+            return found if limit is None else found[:limit]
+
+        found = []
+        for group, keywords in self._entries:
+            if limit is not None and len(found) >= limit:
+                break
+            for keyword in keywords:
+                if keyword in text:
+                    found.append(group)
+                    break
+        return found
+
+    def first(self, text: str) -> Optional[str]:
+        """Return the first matching group, or None."""
+        found = self.find(text, limit=1)
+        return found[0] if found else None